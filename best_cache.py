@@ -0,0 +1,100 @@
+from collections import OrderedDict
+import hashlib
+import os
+import pandas as pd
+import ingest
+
+# Best value per instance and ratio-to-best tables, computed once per (input file version, metric,
+# direction) and shared by every profile, snapshot and summary computation. Recently used tables are
+# kept in memory and every table is spilled to disk, so other processes and later runs reuse it.
+cache_dir = '.best_cache'
+max_entries = 16
+
+# Spilled tables kept on disk; tables of older file versions are never read again, so the least
+# recently used tables beyond this number are deleted
+max_spill_files = 64
+
+memory_cache: OrderedDict[tuple, pd.DataFrame | pd.Series] = OrderedDict()
+
+
+# A file changes version whenever its path, size or modification time changes
+def file_version(filename: str) -> str:
+    stat = os.stat(filename)
+    return hashlib.sha1(f'{os.path.abspath(filename)}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()[:16]
+
+
+# Deletes the least recently used spilled tables beyond max_spill_files. Another process may be
+# evicting at the same time, so files that are already gone are skipped.
+def evict_spilled():
+    spill_files = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.pkl'):
+            try:
+                spill_files.append((entry.stat().st_mtime_ns, entry.path))
+            except FileNotFoundError:
+                pass
+    for _, path in sorted(spill_files)[:max(len(spill_files) - max_spill_files, 0)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def cached(key: tuple, compute, spill: bool = True):
+    if key in memory_cache:
+        memory_cache.move_to_end(key)
+        return memory_cache[key]
+    spill_filename = os.path.join(cache_dir, hashlib.sha1(repr(key).encode()).hexdigest() + '.pkl')
+    if spill and os.path.exists(spill_filename):
+        value = pd.read_pickle(spill_filename)
+        # The modification time records the last use
+        os.utime(spill_filename)
+    else:
+        value = compute()
+    if spill and not os.path.exists(spill_filename):
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write then rename so concurrent scripts never read a partial file
+        temporary_filename = f'{spill_filename}.{os.getpid()}'
+        pd.to_pickle(value, temporary_filename)
+        os.replace(temporary_filename, spill_filename)
+        evict_spilled()
+    memory_cache[key] = value
+    if len(memory_cache) > max_entries:
+        memory_cache.popitem(last=False)
+    return value
+
+
+# The raw file and its per-metric rows are only kept in memory, the file itself is already on disk.
+# Missing runs raise unless require_complete is False; either way the rows read are the same, so
+# the flag is not part of the keys.
+def load(filename: str, require_complete: bool = True) -> pd.DataFrame:
+    return cached((file_version(filename), 'data'), lambda: ingest.read(filename, require_complete=require_complete), spill=False)
+
+
+# Rows of one metric
+def metric_table(filename: str, metric_name: str, require_complete: bool = True) -> pd.DataFrame:
+    def compute():
+        metrics_df = load(filename, require_complete)
+        metric_df = metrics_df[metrics_df['metric name'] == metric_name].reset_index(drop=True)
+        # Only keep the names that occur in the rows of the metric
+        return metric_df.apply(lambda column: column.cat.remove_unused_categories() if isinstance(column.dtype, pd.CategoricalDtype) else column)
+    return cached((file_version(filename), metric_name, 'rows'), compute, spill=False)
+
+
+# Best (max or min) value of the metric on each instance
+def best_per_instance(filename: str, metric_name: str, direction: str, require_complete: bool = True) -> pd.Series:
+    if direction not in ('max', 'min'):
+        raise ValueError(f"unknown direction '{direction}', expected 'max' or 'min'")
+    return cached((file_version(filename), metric_name, direction, 'best'), lambda: metric_table(filename, metric_name, require_complete).groupby('instance')['metric value'].agg(direction))
+
+
+# Rows of the metric with 'metric value' replaced by the deviation from the best value of the
+# instance: best / value when the best is the max, value / best when it is the min (so always >= 1)
+def ratio_table(filename: str, metric_name: str, direction: str, require_complete: bool = True) -> pd.DataFrame:
+    def compute():
+        metric_df = metric_table(filename, metric_name, require_complete)
+        best_value = metric_df['instance'].map(best_per_instance(filename, metric_name, direction, require_complete)).astype(float)
+        ratio_df = metric_df.copy()
+        ratio_df['metric value'] = best_value / metric_df['metric value'] if direction == 'max' else metric_df['metric value'] / best_value
+        return ratio_df
+    return cached((file_version(filename), metric_name, direction, 'ratio'), compute)
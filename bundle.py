@@ -0,0 +1,188 @@
+from best_cache import file_version
+from datetime import datetime, timezone
+from registry import solver_order
+from shards import profiles, run_lengths
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Long-format schema of the bundle: one row per (metric, variant, target, x, solver). The x axis is
+# the deviation from best for the profiles and the time for the run-length curves. The dynamic
+# profiles take the time as the target and the deviation as x. The ERT summaries of ert.py hold
+# times and counts rather than fractions and stay in their own CSVs.
+schema = {
+    'metric': 'category',
+    'variant': 'category',
+    'target': 'float64',
+    'x': 'float64',
+    'solver': 'category',
+    'fraction': 'float64',
+}
+bundle_format_version = 1
+metadata_key = b'results'
+
+# Short name of every metric, as used in the output filenames
+metric_keys = {metric_name: name for name, (metric_name, _) in profiles.items()}
+
+
+# Wide outputs collected into the bundle: metric, variant and target of each CSV. The profiles have
+# no target, and the approximate outputs of sketches.py are variants of their exact counterparts.
+def wide_sources() -> dict[str, tuple[str, str, float]]:
+    sources = {name: (name, 'profile', np.nan) for name in profiles}
+    for name, (metric_name, _, kind, target) in run_lengths.items():
+        sources[name] = (metric_keys[metric_name], 'deviation' if kind == 'deviation' else name.rsplit('_', 1)[-1], target)
+    # Curves of runs meeting the targets of every metric at once, written by joint_targets.py
+    sources.update({'joint_snapshots_' + variant: ('joint', variant, np.nan) for variant in ['easy', 'hard']})
+    sources.update({name + '_approximate': (metric, variant + ' approximate', target) for name, (metric, variant, target) in sources.items()})
+    return sources
+
+
+# Outputs that are already long, with one target per row: the run-time distributions of ert.py
+long_sources = {name + '_runtime_distribution': (name, 'runtime distribution') for name in profiles}
+
+# Profiles at every grid time written by dynamic_profiles.py, indexed by (time, rho)
+dynamic_sources = {name + '_dynamic_profiles': (name, 'dynamic profile') for name in profiles}
+
+
+def melt_wide(cumulative_distribution_df: pd.DataFrame, metric: str, variant: str, target: float) -> pd.DataFrame:
+    long_df = cumulative_distribution_df.rename_axis('x').reset_index().melt(id_vars='x', var_name='solver', value_name='fraction')
+    long_df = long_df[long_df['fraction'].notna()]
+    return long_df.assign(metric=metric, variant=variant, target=target)
+
+
+# Every output CSV found in the directory, as one typed long-format table and the metadata of its sources
+def collect(directory: str = '.') -> tuple[pd.DataFrame, dict]:
+    parts, sources = [], {}
+    for name, (metric, variant, target) in wide_sources().items():
+        filename = os.path.join(directory, name + '.csv')
+        if os.path.exists(filename):
+            parts.append(melt_wide(pd.read_csv(filename, index_col=0, float_precision='round_trip'), metric, variant, target))
+            sources[name] = {'metric': metric, 'variant': variant, 'target': None if np.isnan(target) else target, 'version': file_version(filename)}
+    for name, (metric, variant) in long_sources.items():
+        filename = os.path.join(directory, name + '.csv')
+        if os.path.exists(filename):
+            long_df = pd.read_csv(filename, float_precision='round_trip').rename(columns={'time': 'x'})
+            parts.append(long_df.assign(metric=metric, variant=variant))
+            sources[name] = {'metric': metric, 'variant': variant, 'target': None, 'version': file_version(filename)}
+    for name, (metric, variant) in dynamic_sources.items():
+        filename = os.path.join(directory, name + '.csv')
+        if os.path.exists(filename):
+            dynamic_df = pd.read_csv(filename, index_col=[0, 1], float_precision='round_trip')
+            long_df = dynamic_df.rename_axis(index=['target', 'x']).reset_index().melt(id_vars=['target', 'x'], var_name='solver', value_name='fraction')
+            parts.append(long_df[long_df['fraction'].notna()].assign(metric=metric, variant=variant))
+            sources[name] = {'metric': metric, 'variant': variant, 'target': None, 'version': file_version(filename)}
+    if len(parts) == 0:
+        raise FileNotFoundError(f'no profile or run-length CSV found in {directory}')
+
+    results_df = pd.concat(parts, ignore_index=True)[list(schema)].astype(schema)
+    results_df['solver'] = results_df['solver'].cat.reorder_categories(solver_order(results_df['solver'].cat.categories))
+    results_df = results_df.sort_values(['metric', 'variant', 'target', 'solver', 'x'], na_position='first', ignore_index=True)
+    metadata = {
+        'format version': bundle_format_version,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'metric names': {key: metric_name for metric_name, key in metric_keys.items()},
+        'sources': sources,
+    }
+    return results_df, metadata
+
+
+# Parquet with zstd compression when pyarrow is installed, otherwise a compressed numpy archive that
+# stores every categorical column as integer codes and its categories
+def write_bundle(results_df: pd.DataFrame, metadata: dict, filename: str):
+    if filename.endswith('.parquet'):
+        if pq is None:
+            raise ImportError('writing a parquet bundle requires pyarrow, use a .npz bundle instead')
+        table = pa.Table.from_pandas(results_df, preserve_index=False)
+        table = table.replace_schema_metadata({**table.schema.metadata, metadata_key: json.dumps(metadata).encode()})
+        pq.write_table(table, filename, compression='zstd')
+        return
+    arrays = {'metadata': np.array(json.dumps(metadata))}
+    for column, dtype in schema.items():
+        if dtype == 'category':
+            arrays[column + ' codes'] = results_df[column].cat.codes.to_numpy(dtype=np.int16)
+            arrays[column + ' categories'] = results_df[column].cat.categories.to_numpy(dtype=str)
+        else:
+            arrays[column] = results_df[column].to_numpy(dtype=dtype)
+    with open(filename, 'wb') as file:
+        np.savez_compressed(file, **arrays)
+
+
+def load_bundle(filename: str) -> tuple[pd.DataFrame, dict]:
+    if filename.endswith('.parquet'):
+        if pq is None:
+            raise ImportError('reading a parquet bundle requires pyarrow')
+        table = pq.read_table(filename)
+        return table.to_pandas(), json.loads(table.schema.metadata[metadata_key])
+    with np.load(filename, allow_pickle=False) as arrays:
+        columns = {}
+        for column, dtype in schema.items():
+            if dtype == 'category':
+                columns[column] = pd.Categorical.from_codes(arrays[column + ' codes'], categories=arrays[column + ' categories'])
+            else:
+                columns[column] = arrays[column]
+        return pd.DataFrame(columns), json.loads(arrays['metadata'].item())
+
+
+# The original wide CSVs, rebuilt from the bundle: x as the index and one column per solver
+def wide_view(results_df: pd.DataFrame, metric: str, variant: str, target: float) -> pd.DataFrame:
+    selected = (results_df['metric'] == metric) & (results_df['variant'] == variant)
+    selected &= results_df['target'].isna() if target is None else results_df['target'] == target
+    view_df = results_df[selected].pivot(index='x', columns='solver', values='fraction')
+    view_df = view_df[[solver for solver in results_df['solver'].cat.categories if solver in view_df.columns]]
+    view_df.index.name, view_df.columns.name = None, None
+    return view_df
+
+
+def write_csv_views(results_df: pd.DataFrame, metadata: dict, directory: str = '.') -> list[str]:
+    filenames = []
+    for name, source in metadata['sources'].items():
+        filename = os.path.join(directory, name + '.csv')
+        if name in long_sources:
+            selected = (results_df['metric'] == source['metric']) & (results_df['variant'] == source['variant'])
+            view_df = results_df[selected][['solver', 'target', 'x', 'fraction']].rename(columns={'x': 'time'})
+            # ert.py sorts the solvers by name
+            view_df = view_df.astype({'solver': str}).sort_values(['solver', 'target', 'time'], kind='stable')
+            view_df.to_csv(filename, index=False)
+        elif name in dynamic_sources:
+            selected = (results_df['metric'] == source['metric']) & (results_df['variant'] == source['variant'])
+            view_df = results_df[selected].pivot(index=['target', 'x'], columns='solver', values='fraction')
+            view_df = view_df[[solver for solver in results_df['solver'].cat.categories if solver in view_df.columns]]
+            view_df.index.names, view_df.columns.name = ['time', 'rho'], None
+            view_df.to_csv(filename)
+        else:
+            wide_view(results_df, source['metric'], source['variant'], source['target']).to_csv(filename)
+        filenames.append(filename)
+    return filenames
+
+
+def main():
+    default_output = 'results.parquet' if pq is not None else 'results.npz'
+    parser = argparse.ArgumentParser(description='Bundle every profile, dynamic profile and run-length output into one long-format file.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export', help='collect the output CSVs into a bundle')
+    export_parser.add_argument('--directory', default='.')
+    export_parser.add_argument('--output', default=default_output, help='.parquet (requires pyarrow) or .npz')
+    views_parser = subparsers.add_parser('views', help='rebuild the wide CSVs from a bundle')
+    views_parser.add_argument('bundle', nargs='?', default=default_output)
+    views_parser.add_argument('--directory', default='.')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        results_df, metadata = collect(args.directory)
+        write_bundle(results_df, metadata, args.output)
+        print(f'{args.output}: {len(results_df)} rows from {len(metadata["sources"])} outputs')
+    else:
+        for filename in write_csv_views(*load_bundle(args.bundle), args.directory):
+            print(filename)
+
+
+if __name__ == '__main__':
+    main()
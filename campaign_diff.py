@@ -0,0 +1,223 @@
+from best_cache import load, ratio_table
+from bundle import load_bundle, wide_view
+from grouped import performance_profile
+from matplotlib.ticker import FormatStrFormatter
+from registry import metric_key, metrics, solver_order, solver_style
+import argparse
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+try:
+    from scipy import stats
+except ImportError:
+    stats = None
+
+# Columns identifying a run in both campaigns
+run_key = ['metric name', 'problem', 'instance', 'solver', 'seed']
+
+# Changes with an adjusted p-value below this level are significant
+significance_level = 0.05
+
+# Deviation grid of the profile shifts: None for every distinct deviation of the two campaigns,
+# otherwise that many log-spaced deviations
+num_rho_values = None
+
+
+def is_bundle(filename: str) -> bool:
+    return filename.endswith(('.parquet', '.npz'))
+
+
+# Runs of the two campaigns side by side, aligned on the run key with one indexed join. Either campaign
+# may miss runs; runs of only one campaign (a new solver, a dropped instance) are kept with NaN for
+# the other.
+def align_campaigns(old_filename: str, new_filename: str) -> pd.DataFrame:
+    aligned = []
+    for filename in [old_filename, new_filename]:
+        df = load(filename, require_complete=False)[run_key + ['metric value']]
+        # Both files have their own categories, so join on the names themselves
+        aligned.append(df.astype({column: str for column in run_key if column != 'seed'}).set_index(run_key)['metric value'])
+    return aligned[0].to_frame('old').join(aligned[1].to_frame('new'), how='outer')
+
+
+# Deviation of every run from the best run of its instance over both campaigns, so that the old and
+# new ratios share one reference. With s = +1 for max and -1 for min metrics, the best is the max of
+# s * value over the instance, so one grouped max serves both directions.
+def shared_ratios(aligned_df: pd.DataFrame) -> pd.DataFrame:
+    directions = {metric['name']: metric['direction'] for metric in metrics.values()}
+    sign = np.where(aligned_df.index.get_level_values('metric name').map(directions) == 'max', 1.0, -1.0)[:, None]
+    oriented = aligned_df[['old', 'new']].to_numpy() * sign
+    instance_key = [aligned_df.index.get_level_values('metric name'), aligned_df.index.get_level_values('instance')]
+    best = pd.DataFrame(oriented, index=aligned_df.index).groupby(instance_key).transform('max').max(axis=1).to_numpy()[:, None]
+    ratio = np.where(sign > 0, best / oriented, oriented / best)
+    return pd.DataFrame(ratio, index=aligned_df.index, columns=['old', 'new'])
+
+
+# Profiles of both campaigns on a shared deviation grid and their shift, new minus old, per solver
+def profile_shift(ratio_df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    ratios = ratio_df.to_numpy()
+    ratios = ratios[~np.isnan(ratios)]
+    if num_rho_values is None:
+        rho_values = np.unique(ratios)
+    else:
+        rho_values = np.geomspace(1.0, ratios.max(), num_rho_values)
+    profiles = []
+    for campaign in ['old', 'new']:
+        campaign_df = ratio_df[campaign].dropna().rename('metric value').reset_index()
+        profiles.append(performance_profile(campaign_df, rho_values))
+    old_profile_df, new_profile_df = profiles
+    shift_solvers = solver_order(set(old_profile_df.columns) & set(new_profile_df.columns))
+    return old_profile_df, new_profile_df, new_profile_df[shift_solvers] - old_profile_df[shift_solvers]
+
+
+# Profiles read back from a results bundle, or computed from a metrics file on its own best values
+def campaign_profiles(filename: str) -> dict[str, pd.DataFrame]:
+    if is_bundle(filename):
+        results_df, _ = load_bundle(filename)
+        return {key: wide_view(results_df, key, 'profile', None) for key in metrics if ((results_df['metric'] == key) & (results_df['variant'] == 'profile')).any()}
+    return {key: performance_profile(ratio_table(filename, metric['name'], metric['direction'], require_complete=False)) for key, metric in metrics.items()}
+
+
+# Shift between two step profiles, each evaluated at every deviation of either one
+def step_shift(old_profile_df: pd.DataFrame, new_profile_df: pd.DataFrame) -> pd.DataFrame:
+    rho_values = np.union1d(old_profile_df.index, new_profile_df.index)
+    old_profile_df = old_profile_df.reindex(rho_values).ffill().fillna(0.0)
+    new_profile_df = new_profile_df.reindex(rho_values).ffill().fillna(0.0)
+    shift_solvers = solver_order(set(old_profile_df.columns) & set(new_profile_df.columns))
+    return new_profile_df[shift_solvers] - old_profile_df[shift_solvers]
+
+
+# Per (metric, problem, instance, solver): median deviations of both campaigns, their relative change
+# (positive is worse) and a rank-sum test of the old and new seeds. The groups are unstacked into one
+# (group x seed) matrix per campaign and every test runs in a single vectorized call.
+def instance_changes(ratio_df: pd.DataFrame) -> pd.DataFrame:
+    old_values = ratio_df['old'].unstack('seed')
+    new_values = ratio_df['new'].unstack('seed').reindex(old_values.index)
+    old_matrix, new_matrix = old_values.to_numpy(), new_values.to_numpy()
+    changes_df = old_values.index.to_frame(index=False)
+    changes_df['old runs'] = np.sum(~np.isnan(old_matrix), axis=1)
+    changes_df['new runs'] = np.sum(~np.isnan(new_matrix), axis=1)
+    with np.errstate(all='ignore'):
+        changes_df['old median ratio'] = np.nanmedian(old_matrix, axis=1)
+        changes_df['new median ratio'] = np.nanmedian(new_matrix, axis=1)
+    changes_df['change'] = changes_df['new median ratio'] / changes_df['old median ratio'] - 1.0
+    changes_df['p-value'] = np.nan
+    if stats is not None:
+        tested = ((changes_df['old runs'] > 1) & (changes_df['new runs'] > 1)).to_numpy()
+        changes_df.loc[tested, 'p-value'] = stats.mannwhitneyu(old_matrix[tested], new_matrix[tested], axis=1, nan_policy='omit').pvalue
+    changes_df['adjusted p-value'] = adjusted_p_values(changes_df)
+    changes_df['significant'] = changes_df['adjusted p-value'] < significance_level
+    changes_df['improvement'] = changes_df['significant'] & (changes_df['change'] < 0)
+    changes_df['regression'] = changes_df['significant'] & (changes_df['change'] > 0)
+    return changes_df
+
+
+# Benjamini-Hochberg adjustment of the p-values, within every metric
+def adjusted_p_values(changes_df: pd.DataFrame) -> np.ndarray:
+    adjusted = np.full(len(changes_df), np.nan)
+    if stats is None:
+        return adjusted
+    for _, positions in changes_df.groupby('metric name').indices.items():
+        p_values = changes_df['p-value'].to_numpy()[positions]
+        tested = ~np.isnan(p_values)
+        if tested.any():
+            adjusted[positions[tested]] = stats.false_discovery_control(p_values[tested])
+    return adjusted
+
+
+# Per (metric, solver): matched runs, median deviations, largest profile gain and loss, instances
+# improved and regressed, and a signed-rank test of the instance medians paired across campaigns
+def solver_changes(ratio_df: pd.DataFrame, changes_df: pd.DataFrame, shifts: dict[str, pd.DataFrame]) -> pd.DataFrame:
+    matched = ratio_df.dropna()
+    grouped = matched.groupby(level=['metric name', 'solver'])
+    summary_df = grouped.size().rename('matched runs').to_frame()
+    summary_df['old median ratio'] = grouped['old'].median()
+    summary_df['new median ratio'] = grouped['new'].median()
+    instance_grouped = changes_df.groupby(['metric name', 'solver'])
+    summary_df['improved instances'] = instance_grouped['improvement'].sum()
+    summary_df['regressed instances'] = instance_grouped['regression'].sum()
+    # Metrics and solvers in registry order
+    summary_df = summary_df.reset_index()
+    metric_names = [metric['name'] for metric in metrics.values()]
+    summary_df = summary_df.sort_values(['metric name', 'solver'], key=lambda column: column.map({name: i for i, name in enumerate(metric_names if column.name == 'metric name' else solver_order(column.unique()))}), ignore_index=True)
+    keys = summary_df['metric name'].map(metric_key)
+    summary_df['largest profile gain'] = [max(0.0, shifts[key][solver].max()) if key in shifts and solver in shifts[key] else np.nan for key, solver in zip(keys, summary_df['solver'])]
+    summary_df['largest profile loss'] = [max(0.0, -shifts[key][solver].min()) if key in shifts and solver in shifts[key] else np.nan for key, solver in zip(keys, summary_df['solver'])]
+    summary_df['p-value'] = np.nan
+    if stats is not None:
+        medians = changes_df.set_index(['metric name', 'solver', 'problem', 'instance'])[['old median ratio', 'new median ratio']]
+        old_matrix = medians['old median ratio'].unstack(['problem', 'instance']).reindex(pd.MultiIndex.from_frame(summary_df[['metric name', 'solver']]))
+        new_matrix = medians['new median ratio'].unstack(['problem', 'instance']).reindex(old_matrix.index)
+        differences = (new_matrix - old_matrix).to_numpy()
+        tested = np.sum(~np.isnan(differences) & (differences != 0), axis=1) > 0
+        if tested.any():
+            summary_df.loc[tested, 'p-value'] = stats.wilcoxon(differences[tested], axis=1, nan_policy='omit').pvalue
+    return summary_df
+
+
+def plot_shift(shift_df: pd.DataFrame, metric_name: str, filename: str):
+    fig, ax = plt.subplots()
+    ax.grid(alpha=0.5, color='gray', linestyle='dashed', linewidth=0.5, which='both')
+    ax.axhline(0.0, color='black', linewidth=0.8)
+    figure_solvers = list(shift_df.columns)
+    for solver in figure_solvers:
+        style = solver_style(solver, figure_solvers)
+        ax.plot(shift_df.index, shift_df[solver], label=style['label'], marker = style['marker'], color = style['color'], alpha = 0.80, markevery = 0.02, drawstyle='steps-post')
+    ax.set_xscale("log")
+    ax.xaxis.set_major_formatter(FormatStrFormatter('%.1f'))
+    ax.set_xlabel('Deviation from best ' + metric_name)
+    ax.set_ylabel('Change in Fraction of Executions (new - old)')
+    ax.legend(loc='best')
+    fig.tight_layout()
+    fig.savefig(filename)
+    plt.close(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Differences between two campaigns: profile shifts per solver and per-instance regressions.')
+    parser.add_argument('old', help='metrics file or results bundle of the reference campaign')
+    parser.add_argument('new', help='metrics file or results bundle of the new campaign')
+    parser.add_argument('--prefix', default='diff', help='prefix of the output files')
+    args = parser.parse_args()
+
+    # Bundles only keep the profiles, each on the best values of its own campaign
+    if is_bundle(args.old) or is_bundle(args.new):
+        old_profiles, new_profiles = campaign_profiles(args.old), campaign_profiles(args.new)
+        for key in [key for key in old_profiles if key in new_profiles]:
+            shift_df = step_shift(old_profiles[key], new_profiles[key])
+            shift_df.to_csv(f'{args.prefix}_{key}_profiles.csv')
+            plot_shift(shift_df, metrics[key]['name'], f'{args.prefix}_{key}_profiles.png')
+            print(f"{metrics[key]['name']}: largest profile gain {shift_df.max().clip(lower=0.0).round(3).to_dict()}, loss {(0.0 - shift_df.min()).clip(lower=0.0).round(3).to_dict()}")
+        print('per-instance regressions and significance need the metrics files of both campaigns')
+        return
+
+    aligned_df = align_campaigns(args.old, args.new)
+    only_old, only_new = aligned_df['new'].isna().sum(), aligned_df['old'].isna().sum()
+    print(f'{len(aligned_df) - only_old - only_new} runs matched, {only_old} only in {args.old}, {only_new} only in {args.new}')
+    ratio_df = shared_ratios(aligned_df)
+
+    shifts = {}
+    for metric_name, metric_ratio_df in ratio_df.groupby(level='metric name'):
+        key = metric_key(metric_name)
+        _, _, shifts[key] = profile_shift(metric_ratio_df)
+        shifts[key].to_csv(f'{args.prefix}_{key}_profiles.csv')
+        plot_shift(shifts[key], metric_name, f'{args.prefix}_{key}_profiles.png')
+
+    changes_df = instance_changes(ratio_df)
+    # Significant regressions first, largest change first
+    changes_df = changes_df.sort_values(['regression', 'change'], ascending=[False, False], ignore_index=True)
+    changes_df.to_csv(f'{args.prefix}_instances.csv', index=False)
+    summary_df = solver_changes(ratio_df, changes_df, shifts)
+    summary_df.to_csv(f'{args.prefix}_solvers.csv', index=False)
+
+    if stats is None:
+        print('scipy is not installed, the p-values are left empty')
+    print(summary_df.to_string(index=False))
+    regressions_df = changes_df[changes_df['regression']]
+    print(f'{len(regressions_df)} significant per-instance regressions at level {significance_level}')
+    if len(regressions_df) > 0:
+        print(regressions_df.head(20).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+from best_cache import metric_table
+from matplotlib.animation import FuncAnimation, PillowWriter
+from matplotlib.ticker import FormatStrFormatter
+from registry import metrics as registered_metrics, solver_codes, solver_order, solver_style
+from render import y_functions
+from time_grid import align_to_grid, time_grid
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+# Largest deviation shown for every metric
+rho_max = {'hvr': 10.0, 'igd': 100.0, 'epsilon': 10.0}
+
+# Metrics, whether their best value is the max or the min, and the largest deviation shown
+metrics = {key: (metric['name'], metric['direction'], rho_max.get(key, 10.0)) for key, metric in registered_metrics.items()}
+
+# Time grid, deviation grid, number of panels of the figure and whether to also write an animation
+time_grid_kind = 'log'
+num_times = 200
+given_time_values = None
+num_rho_values = 200
+num_panels = 6
+animate = False
+
+
+# Performance profile of every solver at every grid time, normalized by the best value of the
+# instance over all solvers and seeds at that time. Each deviation is binned once into the rho grid
+# and the bin counts are accumulated, so the whole (time x rho x solver) array costs one pass over
+# the aligned (run x time) values. Times at which a solver lacks data for some run are NaN.
+def dynamic_profiles(runs_df: pd.DataFrame, values: np.ndarray, direction: str, rho_values: np.ndarray) -> tuple[list[str], np.ndarray]:
+    instances, instance_of_run = np.unique(runs_df['instance'].to_numpy(dtype=str), return_inverse=True)
+    profile_solvers = solver_order(runs_df['solver'].unique())
+    solver_of_run = solver_codes(runs_df['solver'], profile_solvers)
+    num_times = values.shape[1]
+
+    # Best value of each instance at each time
+    if direction == 'max':
+        best = np.full((len(instances), num_times), -np.inf)
+        np.fmax.at(best, instance_of_run, values)
+        ratio = best[instance_of_run] / values
+    else:
+        best = np.full((len(instances), num_times), np.inf)
+        np.fmin.at(best, instance_of_run, values)
+        ratio = values / best[instance_of_run]
+
+    # ratio <= rho_values[j] exactly when j >= bin, so cumulative bin counts give the profile
+    has_data = ~np.isnan(ratio)
+    rho_bin = np.searchsorted(rho_values, np.where(has_data, ratio, np.inf), side='left')
+    counts = np.zeros((len(profile_solvers), num_times, len(rho_values) + 1), dtype=np.int64)
+    time_index = np.broadcast_to(np.arange(num_times), ratio.shape)
+    solver_index = np.broadcast_to(solver_of_run[:, None], ratio.shape)
+    np.add.at(counts, (solver_index[has_data], time_index[has_data], rho_bin[has_data]), 1)
+    within_rho = np.cumsum(counts, axis=2)[:, :, :-1]
+
+    with_data = np.zeros((len(profile_solvers), num_times), dtype=np.int64)
+    np.add.at(with_data, solver_of_run, has_data)
+    num_runs = np.bincount(solver_of_run, minlength=len(profile_solvers))
+    complete = with_data == num_runs[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        profile = np.where(complete[:, :, None], within_rho / num_runs[:, None, None], np.nan)
+    return profile_solvers, profile.transpose(1, 2, 0)
+
+
+def plot_profile(ax, rho_values: np.ndarray, profile: np.ndarray, profile_solvers: list[str], title: str):
+    ax.set_title(title)
+    ax.grid(alpha=0.5, color='gray', linestyle='dashed', linewidth=0.5, which='both')
+    for solver in solver_order(profile_solvers):
+        style = solver_style(solver, profile_solvers)
+        ax.plot(rho_values, profile[:, profile_solvers.index(solver)], label=style['label'], marker = style['marker'], color = style['color'], alpha = 0.80, markevery = 0.1)
+    ax.set_xscale("log")
+    ax.set_yscale("function", functions=y_functions)
+    ax.set_ylim(0.0, 1.0)
+    ax.xaxis.set_major_formatter(FormatStrFormatter('%.1f'))
+    ax.yaxis.set_major_formatter(FormatStrFormatter('%.1f'))
+
+
+def main():
+    # Load the data
+    metrics_snapshots_filename = 'metrics_snapshots.csv'
+
+    for key, (metric_name, direction, rho_max) in metrics.items():
+        snapshots_df = metric_table(metrics_snapshots_filename, metric_name)
+        time_values = time_grid(snapshots_df, time_grid_kind, num_times, given_time_values)
+        runs_df, values = align_to_grid(snapshots_df, time_values)
+        rho_values = np.geomspace(1.0, rho_max, num_rho_values)
+        profile_solvers, profile = dynamic_profiles(runs_df, values, direction, rho_values)
+
+        # Drop the leading times at which some solver does not have data for every run yet
+        complete = ~np.isnan(profile).any(axis=(1, 2))
+        time_values, profile = time_values[complete], profile[complete]
+        if len(time_values) == 0:
+            continue
+
+        index = pd.MultiIndex.from_product([time_values, rho_values], names=['time', 'rho'])
+        pd.DataFrame(profile.reshape(-1, len(profile_solvers)), index=index, columns=profile_solvers).to_csv(key + '_dynamic_profiles.csv')
+
+        # Plot the profiles at evenly spread grid times in a multi-panel figure
+        panels = np.unique(np.round(np.linspace(0, len(time_values) - 1, num_panels)).astype(int))
+        num_columns = int(np.ceil(len(panels) / 2))
+        fig, axes = plt.subplots(2, num_columns, figsize=(4 * num_columns, 7), sharex=True, sharey=True, squeeze=False)
+        for ax, panel in zip(axes.flat, panels):
+            plot_profile(ax, rho_values, profile[panel], profile_solvers, f'Time {time_values[panel]:.4g}')
+        for ax in axes.flat[len(panels):]:
+            ax.set_visible(False)
+        fig.supxlabel('Deviation from best ' + metric_name)
+        fig.supylabel('Fraction of Executions')
+        axes.flat[0].legend(loc='best')
+        fig.tight_layout()
+        fig.savefig(key + '_dynamic_profiles.png')
+        plt.close(fig)
+
+        if animate:
+            fig, ax = plt.subplots()
+            def draw(frame):
+                ax.clear()
+                plot_profile(ax, rho_values, profile[frame], profile_solvers, f'Time {time_values[frame]:.4g}')
+                ax.set_xlabel('Deviation from best ' + metric_name)
+                ax.set_ylabel('Fraction of Executions')
+                ax.legend(loc='lower right')
+            FuncAnimation(fig, draw, frames=len(time_values)).save(key + '_dynamic_profiles.gif', writer=PillowWriter(fps=10))
+            plt.close(fig)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+from multiprocessing import Pool
+import argparse
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+
+# The fronts file has one row per nondominated point of a run: problem, instance, solver, seed,
+# optionally snapshot time, and one 'objective <i>' column per objective (unused ones left empty).
+# Objectives are minimized; problems listed here are maximized and get their objectives negated.
+maximized_problems = ['MOMDKP']
+
+run_columns = ['solver', 'seed']
+
+# Version of the cached results, raised whenever the surfaces or differences computed change
+cache_version = 3
+
+# Largest grid of level_sweep, in values, for fronts with 3 or more objectives
+max_grid_size = 50_000_000
+
+
+def objective_columns(fronts_df: pd.DataFrame) -> list[str]:
+    columns = [column for column in fronts_df.columns if column.startswith('objective ')]
+    return [column for column in sorted(columns, key=lambda column: int(column.split()[1])) if fronts_df[column].notna().any()]
+
+
+# Best second objective of every run among its points whose first objective is at most each x value
+def best_y_at(points: np.ndarray, run: np.ndarray, num_runs: int, x_values: np.ndarray) -> np.ndarray:
+    order = np.argsort(points[:, 0], kind='stable')
+    sorted_x, sorted_y, sorted_run = points[order, 0], points[order, 1], run[order]
+    best_y = np.full((len(order), num_runs), np.inf)
+    best_y[np.arange(len(order)), sorted_run] = sorted_y
+    best_y = np.minimum.accumulate(best_y, axis=0)
+    position = np.searchsorted(sorted_x, x_values, side='right') - 1
+    return np.where(position[:, None] >= 0, best_y[np.maximum(position, 0)], np.inf)
+
+
+# Sweep of the points along the last objective for 3 or more objectives. The first d - 2 objectives
+# span a grid of their distinct values, and every grid cell keeps, for every run, the smallest
+# objective d - 1 among the run's points that weakly dominate the cell in the first d - 2 objectives
+# and do not exceed the current last objective. A step adds the points of the next last objective
+# value, which only lowers the cells above them, so every step only visits the box above its points.
+# Yields, at every step, the cells that changed, their values before and after the step, their values
+# at the previous grid value of each grid objective (inf below the grid) and the last objective value.
+# The grid holds (distinct values) ** (d - 2) x runs values, which bounds the work to 3 and 4 objectives.
+def level_sweep(points: np.ndarray, run: np.ndarray, num_runs: int):
+    grid = [np.unique(points[:, i]) for i in range(points.shape[1] - 2)]
+    shape = tuple(len(values) for values in grid)
+    if np.prod(shape, dtype=float) * num_runs > max_grid_size:
+        raise ValueError(f'{points.shape[1]} objectives with {shape} distinct values need a grid of more than {max_grid_size} values, raise max_grid_size or thin the fronts')
+    cell = np.column_stack([np.searchsorted(values, points[:, i]) for i, values in enumerate(grid)])
+    best = np.full(shape + (num_runs,), np.inf)
+    last_values, step_of_point = np.unique(points[:, -1], return_inverse=True)
+    order = np.argsort(step_of_point, kind='stable')
+    step_start = np.searchsorted(step_of_point[order], np.arange(len(last_values) + 1))
+
+    for step, last_value in enumerate(last_values):
+        new = order[step_start[step]:step_start[step + 1]]
+        start = cell[new].min(axis=0)
+        box = tuple(slice(lo, None) for lo in start)
+        previous = best[box].copy()
+        for p in new:
+            above = tuple(slice(lo, None) for lo in cell[p] - start) + (run[p],)
+            best[box][above] = np.minimum(best[box][above], points[p, -2])
+        changed = np.nonzero((best[box] != previous).any(axis=-1))
+        cells = tuple(index + lo for index, lo in zip(changed, start))
+        lower = []
+        for i in range(len(grid)):
+            below = tuple(np.maximum(index - 1, 0) if j == i else index for j, index in enumerate(cells))
+            lower.append(np.where((cells[i] > 0)[:, None], best[below], np.inf))
+        yield tuple(values[index] for values, index in zip(grid, cells)), previous[changed], best[cells], lower, last_value
+
+
+# Minimal points of the k-level sets of the runs found at every step of level_sweep. The k-th smallest
+# of the runs' values of a cell is the height of the k-level set over the cell, and the cell gives a
+# minimal point where that height is below the height before the step and below the heights over the
+# lower neighbouring cells. Yields the points, their position k - 1 among the sorted runs' values of
+# their cell, and the runs of that cell in value order with their sorted values.
+def level_vertices(points: np.ndarray, run: np.ndarray, num_runs: int):
+    for coordinates, previous, current, lower, last_value in level_sweep(points, run, num_runs):
+        order = np.argsort(current, axis=1, kind='stable')
+        height = np.take_along_axis(current, order, axis=1)
+        vertex = np.isfinite(height) & (height < np.sort(previous, axis=1))
+        for lower_best in lower:
+            vertex &= height < np.sort(lower_best, axis=1)
+        cell, position = np.nonzero(vertex)
+        step_vertices = np.column_stack([values[cell] for values in coordinates] + [height[cell, position], np.full(len(cell), last_value)])
+        yield step_vertices, position, order[cell], height[cell]
+
+
+# k-attainment surfaces, for k = 1..number of runs, of one solver on one instance, as the minimal
+# points of every k-level set. With 2 objectives, sweeping the points by the first objective, the
+# k-th smallest of the runs' best second objectives is the surface height. With more objectives they
+# are the level_vertices of the solver's runs.
+def attainment_surfaces(points: np.ndarray, run: np.ndarray, num_runs: int) -> dict[int, np.ndarray]:
+    num_objectives = points.shape[1]
+    surfaces = {}
+    if num_objectives == 2:
+        order = np.argsort(points[:, 0], kind='stable')
+        sorted_x, sorted_y, sorted_run = points[order, 0], points[order, 1], run[order]
+        best_y = np.full((len(order), num_runs), np.inf)
+        best_y[np.arange(len(order)), sorted_run] = sorted_y
+        best_y = np.sort(np.minimum.accumulate(best_y, axis=0), axis=1)
+        # Only the last point of each group of equal first objectives closes a sweep step
+        last_of_x = np.append(sorted_x[1:] != sorted_x[:-1], True)
+        x, best_y = sorted_x[last_of_x], best_y[last_of_x]
+        for k in range(1, num_runs + 1):
+            y = best_y[:, k - 1]
+            improves = np.isfinite(y) & np.append(True, y[1:] < y[:-1])
+            surfaces[k] = np.column_stack([x[improves], y[improves]])
+        return surfaces
+
+    levels, vertices = [], []
+    for step_vertices, position, _, _ in level_vertices(points, run, num_runs):
+        levels.append(position + 1)
+        vertices.append(step_vertices)
+    levels = np.concatenate(levels) if levels else np.empty(0, dtype=int)
+    vertices = np.concatenate(vertices) if vertices else np.empty((0, num_objectives))
+    for k in range(1, num_runs + 1):
+        surfaces[k] = vertices[levels == k]
+    return surfaces
+
+
+# EAF of two solvers, and their difference, at the points where the attainment can change. With 2
+# objectives the pooled points are swept by the first objective: at every pooled first objective, both
+# EAFs only change along the second objective at the runs' best second objectives so far, so those are
+# the only points evaluated, O(points x runs) instead of the full grid of pooled coordinates. With more
+# objectives the points evaluated are the level_vertices of the runs of both solvers together: below
+# every point of the space lies one of them with the same pair of EAFs, so every region where the
+# two solvers differ is reported.
+def eaf_difference(points_a: np.ndarray, run_a: np.ndarray, num_runs_a: int, points_b: np.ndarray, run_b: np.ndarray, num_runs_b: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    pooled = np.concatenate([points_a, points_b])
+    if pooled.shape[1] > 2:
+        parts, eafs_a, eafs_b = [], [], []
+        for step_vertices, position, order, height in level_vertices(pooled, np.concatenate([run_a, run_b + num_runs_a]), num_runs_a + num_runs_b):
+            # Runs tied at a vertex give one point, at the last of them
+            rows = np.arange(len(position))
+            last_tied = (position == height.shape[1] - 1) | (height[rows, np.minimum(position + 1, height.shape[1] - 1)] > height[rows, position])
+            count_a = np.cumsum(order < num_runs_a, axis=1)[rows, position]
+            parts.append(step_vertices[last_tied])
+            eafs_a.append(count_a[last_tied] / num_runs_a)
+            eafs_b.append((position + 1 - count_a)[last_tied] / num_runs_b)
+        if len(parts) == 0:
+            return np.empty((0, pooled.shape[1])), np.empty(0), np.empty(0)
+        return np.concatenate(parts), np.concatenate(eafs_a), np.concatenate(eafs_b)
+
+    x = np.unique(pooled[:, 0])
+    best_y_a = best_y_at(points_a, run_a, num_runs_a, x)
+    best_y_b = best_y_at(points_b, run_b, num_runs_b, x)
+    y = np.concatenate([best_y_a, best_y_b], axis=1)
+    eaf_a = (best_y_a[:, None, :] <= y[:, :, None]).mean(axis=2)
+    eaf_b = (best_y_b[:, None, :] <= y[:, :, None]).mean(axis=2)
+    z = np.column_stack([np.repeat(x, y.shape[1]), y.ravel()])
+    finite = np.isfinite(z[:, 1])
+    z, unique = np.unique(z[finite], axis=0, return_index=True)
+    return z, eaf_a.ravel()[finite][unique], eaf_b.ravel()[finite][unique]
+
+
+def instance_key(instance_df: pd.DataFrame) -> str:
+    return hashlib.sha1(pd.util.hash_pandas_object(instance_df, index=False).to_numpy().tobytes()).hexdigest()[:16]
+
+
+# Surfaces and pairwise differences of one instance, cached on disk by the hash of its fronts and the
+# cache version, so results of an older computation are never served
+def compute_instance(instance: str, instance_df: pd.DataFrame, cache_dir: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+    cache_filename = os.path.join(cache_dir, f'{instance}_{instance_key(instance_df)}_v{cache_version}.pkl')
+    if os.path.exists(cache_filename):
+        return pd.read_pickle(cache_filename)
+
+    columns = objective_columns(instance_df)
+    sign = -1.0 if instance_df['problem'].iloc[0] in maximized_problems else 1.0
+    points_of_solver = {}
+    for solver, solver_df in instance_df.groupby('solver', sort=False):
+        points = sign * solver_df[columns].to_numpy(dtype=float)
+        seeds, run = np.unique(solver_df['seed'].to_numpy(), return_inverse=True)
+        points_of_solver[solver] = (points, run, len(seeds))
+
+    surfaces = []
+    for solver, (points, run, num_runs) in points_of_solver.items():
+        for k, surface in attainment_surfaces(points, run, num_runs).items():
+            surface_df = pd.DataFrame(sign * surface, columns=columns)
+            surface_df.insert(0, 'instance', instance)
+            surface_df.insert(1, 'solver', solver)
+            surface_df.insert(2, 'level', k / num_runs)
+            surfaces.append(surface_df)
+
+    differences = []
+    solvers = list(points_of_solver)
+    for i in range(len(solvers)):
+        for j in range(i + 1, len(solvers)):
+            z, eaf_a, eaf_b = eaf_difference(*points_of_solver[solvers[i]], *points_of_solver[solvers[j]])
+            # Only the regions where the two solvers differ are kept
+            differs = eaf_a != eaf_b
+            difference_df = pd.DataFrame(sign * z[differs], columns=columns)
+            difference_df.insert(0, 'instance', instance)
+            difference_df.insert(1, 'solver a', solvers[i])
+            difference_df.insert(2, 'solver b', solvers[j])
+            difference_df['eaf a'] = eaf_a[differs]
+            difference_df['eaf b'] = eaf_b[differs]
+            difference_df['difference'] = eaf_a[differs] - eaf_b[differs]
+            differences.append(difference_df)
+
+    result = (pd.concat(surfaces, ignore_index=True) if surfaces else pd.DataFrame(), pd.concat(differences, ignore_index=True) if differences else pd.DataFrame())
+    pd.to_pickle(result, cache_filename)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Empirical attainment surfaces and EAF differences of the solvers on every instance.')
+    parser.add_argument('--fronts', default='fronts.csv')
+    parser.add_argument('--snapshot-time', type=float, help='use the snapshot fronts at this time instead of the final fronts')
+    parser.add_argument('--cache-dir', default='eaf_cache')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    # Load the data
+    fronts_df = pd.read_csv(args.fronts)
+    if 'snapshot time' in fronts_df.columns:
+        if args.snapshot_time is None:
+            # Final fronts: the last snapshot of every run
+            last_time = fronts_df.groupby(['instance'] + run_columns)['snapshot time'].transform('max')
+            fronts_df = fronts_df[fronts_df['snapshot time'] == last_time]
+        else:
+            # Fronts as of the given time: the latest snapshot of every run at or before it
+            fronts_df = fronts_df[fronts_df['snapshot time'] <= args.snapshot_time]
+            last_time = fronts_df.groupby(['instance'] + run_columns)['snapshot time'].transform('max')
+            fronts_df = fronts_df[fronts_df['snapshot time'] == last_time]
+
+    os.makedirs(args.cache_dir, exist_ok=True)
+    with Pool(args.workers) as pool:
+        results = pool.starmap(compute_instance, [(instance, instance_df, args.cache_dir) for instance, instance_df in fronts_df.groupby('instance', sort=True)])
+
+    suffix = '' if args.snapshot_time is None else f'_{args.snapshot_time:g}'
+    pd.concat([surfaces for surfaces, _ in results], ignore_index=True).to_csv('eaf_surfaces' + suffix + '.csv', index=False)
+    pd.concat([differences for _, differences in results], ignore_index=True).to_csv('eaf_differences' + suffix + '.csv', index=False)
+
+
+if __name__ == '__main__':
+    main()
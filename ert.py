@@ -0,0 +1,136 @@
+from matplotlib.ticker import FormatStrFormatter
+from registry import metrics as registered_metrics, solver_order, solver_style
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import ingest
+
+# Metrics, whether a run meets a target from above or below, and the targets evaluated for each
+target_values = {
+    'hvr': np.round(np.arange(0.05, 1.0, 0.05), 2),
+    'igd': np.round(np.geomspace(0.5, 0.005, 21), 4),
+    'epsilon': np.round(np.arange(0.05, 1.0, 0.05), 2),
+}
+metrics = {
+    key: (registered_metrics[key]['name'], '>=' if registered_metrics[key]['direction'] == 'max' else '<=', targets)
+    for key, targets in target_values.items()
+}
+
+# Time budget of every run: targets first reached after it count as missed, and runs still going
+# at the budget are censored there. None uses each run's last snapshot.
+time_budget = None
+
+
+# First snapshot time at which each (solver, instance, seed) run reaches each target.
+# Runs that never reach a target are right-censored at the end of their budget
+# (their last snapshot time, or the given budget if it comes first). Runs whose first
+# snapshot comes after the budget are kept, censored at the budget.
+def time_to_target(snapshots_df: pd.DataFrame, targets: np.ndarray, direction: str, budget: float | None = None) -> pd.DataFrame:
+    run_keys = snapshots_df[['solver', 'instance', 'seed']]
+    run = run_keys.groupby(['solver', 'instance', 'seed'], sort=True, observed=True).ngroup().to_numpy()
+    runs_df = run_keys.drop_duplicates().sort_values(['solver', 'instance', 'seed']).reset_index(drop=True)
+    snapshot_time = snapshots_df['snapshot time'].to_numpy(dtype=float)
+    metric_value = snapshots_df['metric value'].to_numpy(dtype=float)
+    targets = np.asarray(targets, dtype=float)
+
+    # Work with "higher is better" values so that a run meets a target once its running best reaches it
+    if direction == '<=':
+        metric_value, signed_targets = -metric_value, -targets
+    else:
+        signed_targets = targets
+
+    # Sort once by run and time and keep the snapshots that improve on the run's best so far
+    order = np.lexsort((snapshot_time, run))
+    run, snapshot_time, metric_value = run[order], snapshot_time[order], metric_value[order]
+    running_best = pd.Series(metric_value).groupby(run).cummax().to_numpy()
+    first_of_run = np.ones(len(run), dtype=bool)
+    first_of_run[1:] = run[1:] != run[:-1]
+    last_of_run = np.ones(len(run), dtype=bool)
+    last_of_run[:-1] = run[:-1] != run[1:]
+    record = first_of_run.copy()
+    record[1:] |= running_best[1:] > running_best[:-1]
+    record_run, record_time, record_best = run[record], snapshot_time[record], running_best[record]
+
+    # Records are increasing in both time and value within a run, so encoding (run, value rank) as one
+    # sorted key lets a single searchsorted find the first record reaching every target of every run
+    levels = np.unique(np.concatenate([record_best, signed_targets]))
+    record_key = record_run.astype(np.int64) * len(levels) + np.searchsorted(levels, record_best)
+    num_runs = len(runs_df)
+    target_key = np.arange(num_runs, dtype=np.int64)[:, None] * len(levels) + np.searchsorted(levels, signed_targets)[None, :]
+    position = np.searchsorted(record_key, target_key, side='left')
+    clipped_position = np.minimum(position, len(record_key) - 1)
+    reached = (position < len(record_key)) & (record_run[clipped_position] == np.arange(num_runs)[:, None])
+
+    censoring_time = snapshot_time[last_of_run]
+    if budget is not None:
+        reached &= record_time[clipped_position] <= budget
+        censoring_time = np.minimum(censoring_time, budget)
+    hitting_time = np.where(reached, record_time[clipped_position], censoring_time[:, None])
+
+    time_to_target_df = runs_df.loc[np.repeat(np.arange(num_runs), len(targets))].reset_index(drop=True)
+    time_to_target_df['target'] = np.tile(targets, num_runs)
+    time_to_target_df['time'] = hitting_time.ravel()
+    time_to_target_df['reached'] = reached.ravel()
+    return time_to_target_df
+
+
+# Expected running time with restarts: total time spent by all runs, successful or censored,
+# divided by the number of successful runs (infinite if no run reaches the target)
+def expected_running_time(time_to_target_df: pd.DataFrame, by: list[str]) -> pd.DataFrame:
+    grouped = time_to_target_df.groupby(by + ['target'], observed=True)
+    ert_df = grouped.agg(total_time=('time', 'sum'), successes=('reached', 'sum'), runs=('reached', 'size')).reset_index()
+    with np.errstate(divide='ignore'):
+        ert_df['ert'] = np.where(ert_df['successes'] > 0, ert_df['total_time'] / ert_df['successes'], np.inf)
+    ert_df['success rate'] = ert_df['successes'] / ert_df['runs']
+    return ert_df
+
+
+# Empirical run-time distribution: fraction of all runs that reached the target by each hitting time
+def runtime_distribution(time_to_target_df: pd.DataFrame) -> pd.DataFrame:
+    num_runs = time_to_target_df.groupby(['solver', 'target'], observed=True)['reached'].transform('size')
+    reached_df = time_to_target_df[time_to_target_df['reached']].assign(runs=num_runs)
+    reached_df = reached_df.sort_values(['solver', 'target', 'time'])
+    reached_df['fraction'] = (reached_df.groupby(['solver', 'target'], observed=True).cumcount() + 1) / reached_df['runs']
+    return reached_df[['solver', 'target', 'time', 'fraction']].reset_index(drop=True)
+
+
+def main():
+    # Load the data
+    metrics_snapshots_filename = 'metrics_snapshots.csv'
+    metrics_snapshots_df = ingest.read(metrics_snapshots_filename)
+
+    for name, (metric_name, direction, targets) in metrics.items():
+        snapshots_df = metrics_snapshots_df[metrics_snapshots_df['metric name'] == metric_name]
+
+        time_to_target_df = time_to_target(snapshots_df, targets, direction, time_budget)
+        time_to_target_df.to_csv(name + '_time_to_target.csv', index=False)
+
+        expected_running_time(time_to_target_df, ['solver', 'instance']).to_csv(name + '_ert_per_instance.csv', index=False)
+        ert_df = expected_running_time(time_to_target_df, ['solver'])
+        ert_df.to_csv(name + '_ert.csv', index=False)
+
+        runtime_distribution(time_to_target_df).to_csv(name + '_runtime_distribution.csv', index=False)
+
+        # Plot the expected running time of each solver against the target
+        plt.figure()
+        plt.xlabel('Target ' + metric_name)
+        plt.ylabel('Expected Running Time')
+        plt.grid(alpha=0.5, color='gray', linestyle='dashed', linewidth=0.5, which='both')
+        figure_solvers = solver_order(ert_df['solver'].unique())
+        for solver in figure_solvers:
+            solver_ert_df = ert_df[ert_df['solver'] == solver]
+            style = solver_style(solver, figure_solvers)
+            plt.plot(solver_ert_df['target'], solver_ert_df['ert'], label=style['label'], marker = style['marker'], color = style['color'], alpha = 0.80)
+        if direction == '<=':
+            plt.xscale("log")
+            plt.gca().invert_xaxis()
+        plt.yscale("log")
+        plt.legend(loc='best')
+        plt.gca().xaxis.set_major_formatter(FormatStrFormatter('%.2f'))
+        plt.tight_layout()
+        plt.savefig(name + '_ert.png')
+        plt.close()
+
+
+if __name__ == '__main__':
+    main()
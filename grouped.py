@@ -0,0 +1,30 @@
+from registry import solver_codes, solver_order
+import numpy as np
+import pandas as pd
+
+
+# Performance profiles of all solvers in one pass: every ratio is binned once into the sorted rho
+# values and the per-solver bin counts are accumulated, instead of one mask per solver and rho.
+# Without rho values, every distinct ratio is one.
+def performance_profile(ratio_df: pd.DataFrame, rho_values: np.ndarray | None = None) -> pd.DataFrame:
+    profile_solvers = solver_order(ratio_df['solver'].unique())
+    solver_of_row = solver_codes(ratio_df['solver'], profile_solvers)
+    ratio = ratio_df['metric value'].to_numpy(dtype=float)
+    if rho_values is None:
+        rho_values = np.unique(ratio)
+    # ratio <= rho_values[j] exactly when j >= bin
+    counts = np.zeros((len(profile_solvers), len(rho_values) + 1), dtype=np.int64)
+    np.add.at(counts, (solver_of_row, np.searchsorted(rho_values, ratio, side='left')), 1)
+    within_rho = np.cumsum(counts, axis=1)[:, :-1]
+    num_rows = np.bincount(solver_of_row, minlength=len(profile_solvers))
+    return pd.DataFrame((within_rho / num_rows[:, None]).T, index=rho_values, columns=profile_solvers)
+
+
+# Number of runs of every solver for which a condition holds at every grid time, from a
+# (run x time) boolean array, in one accumulation over the runs
+def count_by_solver(runs_df: pd.DataFrame, holds: np.ndarray, group_solvers: list[str]) -> np.ndarray:
+    solver_of_run = solver_codes(runs_df['solver'], group_solvers)
+    known = solver_of_run >= 0
+    counts = np.zeros((len(group_solvers), holds.shape[1]), dtype=np.int64)
+    np.add.at(counts, solver_of_run[known], holds[known])
+    return counts
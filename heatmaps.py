@@ -0,0 +1,116 @@
+from best_cache import metric_table
+from matplotlib.colors import LogNorm
+from matplotlib.ticker import FormatStrFormatter
+from registry import metrics as registered_metrics, solver_order
+import argparse
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+# Metrics and whether their best value is the max or the min
+metrics = {key: (metric['name'], metric['direction']) for key, metric in registered_metrics.items()}
+
+
+# (instance x solver x seed) matrix of a metric, built with one pivot. Seeds are the same for every
+# solver of an instance, so the seed axis pairs the runs of different solvers. Missing runs are NaN.
+def run_matrix(metrics_filename: str, metric_name: str) -> tuple[pd.DataFrame, list[str], np.ndarray]:
+    metric_df = metric_table(metrics_filename, metric_name)
+    matrix_df = metric_df.pivot_table(index=['problem', 'instance'], columns=['solver', 'seed'], values='metric value', aggfunc='last')
+    matrix_solvers = solver_order(matrix_df.columns.get_level_values('solver').unique())
+    seeds = sorted(matrix_df.columns.get_level_values('seed').unique())
+    matrix_df = matrix_df.reindex(columns=pd.MultiIndex.from_product([matrix_solvers, seeds], names=['solver', 'seed']))
+    values = matrix_df.to_numpy(dtype=float).reshape(len(matrix_df), len(matrix_solvers), len(seeds))
+    return matrix_df.index.to_frame(index=False), matrix_solvers, values
+
+
+# Deviation of every run from the best run of its instance (always >= 1)
+def ratio_to_best(values: np.ndarray, direction: str) -> np.ndarray:
+    if direction == 'max':
+        return np.nanmax(values, axis=(1, 2), keepdims=True) / values
+    return values / np.nanmin(values, axis=(1, 2), keepdims=True)
+
+
+# Per (instance, solver): median ratio to best, number of seeds on which the solver is the best of
+# all solvers (ties count for every tied solver) and variance of the metric across seeds
+def instance_statistics(instances_df: pd.DataFrame, matrix_solvers: list[str], values: np.ndarray, direction: str) -> pd.DataFrame:
+    ratio = ratio_to_best(values, direction)
+    best_of_seed = np.nanmax(values, axis=1, keepdims=True) if direction == 'max' else np.nanmin(values, axis=1, keepdims=True)
+    wins = np.sum(values == best_of_seed, axis=2)
+    statistics_df = pd.DataFrame({
+        'problem': np.repeat(instances_df['problem'].to_numpy(), len(matrix_solvers)),
+        'instance': np.repeat(instances_df['instance'].to_numpy(), len(matrix_solvers)),
+        'solver': np.tile(matrix_solvers, len(instances_df)),
+        'median ratio': np.nanmedian(ratio, axis=2).ravel(),
+        'wins': wins.ravel(),
+        'seed variance': np.nanvar(values, axis=2, ddof=1).ravel(),
+    })
+    return statistics_df
+
+
+# Fraction of the paired (instance, seed) runs on which solver a is strictly better than solver b
+def dominance(values: np.ndarray, direction: str) -> np.ndarray:
+    a, b = values[:, :, None, :], values[:, None, :, :]
+    better = a > b if direction == 'max' else a < b
+    paired = ~np.isnan(a) & ~np.isnan(b)
+    return better.sum(axis=(0, 3)) / np.maximum(paired.sum(axis=(0, 3)), 1)
+
+
+def plot_difficulty(statistics_df: pd.DataFrame, metric_name: str, filename: str):
+    median_ratio_df = statistics_df.pivot(index='instance', columns='solver', values='median ratio')
+    median_ratio_df = median_ratio_df[[solver for solver in statistics_df['solver'].unique()]]
+    # Hardest instances, with the largest mean deviation over the solvers, at the top
+    median_ratio_df = median_ratio_df.loc[median_ratio_df.mean(axis=1).sort_values(ascending=False).index]
+    fig, ax = plt.subplots(figsize=(6.4, max(4.8, 0.2 * len(median_ratio_df))))
+    image = ax.imshow(median_ratio_df.to_numpy(), aspect='auto', cmap='viridis_r', norm=LogNorm(vmin=1.0, vmax=max(median_ratio_df.max().max(), 1.0 + 1e-9)))
+    ax.set_xticks(range(len(median_ratio_df.columns)), median_ratio_df.columns, rotation=45, ha='right')
+    ax.set_yticks(range(len(median_ratio_df.index)), median_ratio_df.index)
+    colorbar = fig.colorbar(image, ax=ax, label='Median deviation from best ' + metric_name)
+    colorbar.ax.yaxis.set_major_formatter(FormatStrFormatter('%.1f'))
+    colorbar.ax.yaxis.set_minor_formatter(FormatStrFormatter('%.1f'))
+    fig.tight_layout()
+    fig.savefig(filename)
+    plt.close(fig)
+
+
+def plot_dominance(dominance_df: pd.DataFrame, metric_name: str, filename: str):
+    fig, ax = plt.subplots()
+    image = ax.imshow(dominance_df.to_numpy(), cmap='RdBu', vmin=0.0, vmax=1.0)
+    for i in range(len(dominance_df.index)):
+        for j in range(len(dominance_df.columns)):
+            if i != j:
+                ax.text(j, i, f'{dominance_df.iat[i, j]:.2f}', ha='center', va='center', fontsize=8)
+    ax.set_xticks(range(len(dominance_df.columns)), dominance_df.columns, rotation=45, ha='right')
+    ax.set_yticks(range(len(dominance_df.index)), dominance_df.index)
+    ax.set_xlabel('Solver b')
+    ax.set_ylabel('Solver a')
+    fig.colorbar(image, ax=ax, label='Fraction of runs where a has a better ' + metric_name)
+    fig.tight_layout()
+    fig.savefig(filename)
+    plt.close(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-instance difficulty and pairwise solver dominance heatmaps.')
+    parser.add_argument('--metrics', default='metrics.csv')
+    parser.add_argument('--problems', nargs='*', help='only use the instances of these problems')
+    args = parser.parse_args()
+
+    suffix = '' if not args.problems else '_' + '_'.join(args.problems)
+    for key, (metric_name, direction) in metrics.items():
+        instances_df, matrix_solvers, values = run_matrix(args.metrics, metric_name)
+        # Any slice of the matrix reuses the same pivot
+        if args.problems:
+            selected = instances_df['problem'].isin(args.problems).to_numpy()
+            instances_df, values = instances_df[selected].reset_index(drop=True), values[selected]
+
+        statistics_df = instance_statistics(instances_df, matrix_solvers, values, direction)
+        statistics_df.to_csv(key + '_instance_statistics' + suffix + '.csv', index=False)
+        plot_difficulty(statistics_df, metric_name, key + '_difficulty' + suffix + '.png')
+
+        dominance_df = pd.DataFrame(dominance(values, direction), index=matrix_solvers, columns=matrix_solvers)
+        dominance_df.to_csv(key + '_dominance' + suffix + '.csv')
+        plot_dominance(dominance_df, metric_name, key + '_dominance' + suffix + '.png')
+
+
+if __name__ == '__main__':
+    main()
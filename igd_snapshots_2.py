@@ -1,112 +1,56 @@
-from functools import partial
-from matplotlib.ticker import FormatStrFormatter
-import matplotlib.pyplot as plt
-import numpy as np
+from best_cache import ratio_table
+from grouped import count_by_solver
+from registry import metrics, solver_order
+from render import render
+from run_coverage import coverage_fraction, coverage_index, runs_with_data, valid_time_window
+from time_grid import align_to_grid, time_grid
 import pandas as pd
 
-solvers = ["NSGA-II", "NSPSO", "MOEA/D-DE", "MHACO", "IHS", "NS-BRKGA"]
-colors = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf", "#8c7e6e", "#738191"]
+# Time grid of the run-length curves: 'union' of all snapshot times, 'log' spaced or 'given' time values,
+# and 'step' (latest snapshot) or 'linear' interpolation of each run onto it
+time_grid_kind = 'log'
+num_times = 200
+given_time_values = None
+interpolation = 'step'
+
+# Estimate the fractions over the runs that have data at each time, instead of only from the time
+# every run has data on
+partial_coverage = False
 
 # Load the data
 metrics_snapshots_filename = 'metrics_snapshots.csv'
-metrics_snapshots_df = pd.read_csv(metrics_snapshots_filename)
 
 # Set target deviation for metric
-target_deviation = 9.748801264859514
-
-# Filter data for the Modified Inverted Generational Distance
-igd_snapshots_df = metrics_snapshots_df[metrics_snapshots_df['metric name'] == 'Modified Inverted Generational Distance']
-
-# Find the best (min) Modified Inverted Generational Distance 
-best_igd_per_instance = igd_snapshots_df.groupby('instance')['metric value'].min()
-
-# Calculate the ratio of each solver's Modified Inverted Generational Distance to the best Modified Inverted Generational Distance
-igd_ratio_snapshots_df = igd_snapshots_df.copy()
-igd_ratio_snapshots_df['metric value'] = igd_snapshots_df.apply(lambda row: row['metric value'] / best_igd_per_instance[row['instance']], axis=1)
-
-# Initialize a dictionary to hold the cumulative distribution for each solver
-cumulative_distribution = {solver: [] for solver in solvers}
+target_deviation = metrics['igd']['target deviation']
 
-instances = igd_snapshots_df['instance'].unique()
-seeds = igd_snapshots_df['seed'].unique()
+# Calculate the ratio of each solver's Modified Inverted Generational Distance to the best (min) Modified Inverted Generational Distance, shared through the cache
+igd_ratio_snapshots_df = ratio_table(metrics_snapshots_filename, metrics['igd']['name'], metrics['igd']['direction'], require_complete=not partial_coverage)
 
-time_values = []
-igd_snapshots_of_solver_instance_seed: dict[str, dict[str, dict[int, pd.DataFrame]]] = {}
-for solver in solvers:
-    igd_snapshots_of_solver_instance_seed[solver] = {}
-    for instance in instances:
-        igd_snapshots_of_solver_instance_seed[solver][instance] = {}
-        for seed in seeds:
-            igd_snapshots_of_solver_instance_seed[solver][instance][seed] = igd_ratio_snapshots_df[(igd_ratio_snapshots_df['solver'] == solver) & (igd_ratio_snapshots_df['instance'] == instance) & (igd_ratio_snapshots_df['seed'] == seed)]
-            time_values_temp = igd_snapshots_of_solver_instance_seed[solver][instance][seed]['snapshot time'].unique()
-            if len(time_values) == 0 or time_values[0] < time_values_temp[0]:
-                time_values = time_values_temp
+instances = igd_ratio_snapshots_df['instance'].unique()
+seeds = igd_ratio_snapshots_df['seed'].unique()
 
-igd_snapshots_of_solver_instance_seed_time: dict[str, dict[str, dict[int, dict[float, pd.DataFrame]]]] = {}
-for solver in solvers:
-    igd_snapshots_of_solver_instance_seed_time[solver] = {}
-    for instance in instances:
-        igd_snapshots_of_solver_instance_seed_time[solver][instance] = {}
-        for seed in seeds:
-            igd_snapshots_of_solver_instance_seed_time[solver][instance][seed] = {}
-            for time in time_values:
-                igd_snapshots_of_solver_instance_seed_time[solver][instance][seed][time] = igd_snapshots_of_solver_instance_seed[solver][instance][seed][igd_snapshots_of_solver_instance_seed[solver][instance][seed]['snapshot time'] <= time]
-                greatest_time = igd_snapshots_of_solver_instance_seed_time[solver][instance][seed][time]['snapshot time'].max()
-                igd_snapshots_of_solver_instance_seed_time[solver][instance][seed][time] = igd_snapshots_of_solver_instance_seed_time[solver][instance][seed][time][igd_snapshots_of_solver_instance_seed_time[solver][instance][seed][time]['snapshot time'] == greatest_time]
+# Solvers found in the data, in registry order
+igd_solvers = solver_order(igd_ratio_snapshots_df['solver'].unique())
 
-# Calculate the cumulative distribution for each solver
-for solver in solvers:
-    print(solver)
-    for time in time_values:
-        num_meeting_target = 0.0
-        num_not_meeting_target = 0.0
-        for instance in instances:
-            for seed in seeds:
-                if not igd_snapshots_of_solver_instance_seed_time[solver][instance][seed][time].empty > 0:
-                    if igd_snapshots_of_solver_instance_seed_time[solver][instance][seed][time]["metric value"].values[0] <= target_deviation:
-                        num_meeting_target += 1
-                    else:
-                        num_not_meeting_target += 1
-        if num_meeting_target + num_not_meeting_target == len(instances) * len(seeds):
-            cumulative_distribution[solver].append(num_meeting_target / (num_meeting_target + num_not_meeting_target))
-        else:
-            cumulative_distribution[solver].append(-1.0)
+# First and last snapshot of every run, and the times from which the fractions are defined
+igd_coverage_df = coverage_index(igd_ratio_snapshots_df)
+window_start, _ = valid_time_window(igd_coverage_df, partial_coverage)
 
-num_any_negatives = 0
-while True:
-    any_negatives = False
-    for solver in solvers:
-        if cumulative_distribution[solver][num_any_negatives] < 0:
-            any_negatives = True
-            break
-    if any_negatives:
-        num_any_negatives += 1
-    else:
-        break
+# Align every (solver, instance, seed) run on the common time grid, within the valid window
+time_values = time_grid(igd_ratio_snapshots_df, time_grid_kind, num_times, given_time_values)
+time_values = time_values[time_values >= window_start]
+num_with_data = runs_with_data(igd_coverage_df, time_values, igd_solvers).to_numpy().T
+igd_runs_df, igd_values = align_to_grid(igd_ratio_snapshots_df, time_values, interpolation)
 
-# Remove the first num_any_zeros elements from the cumulative distribution
-time_values = time_values[num_any_negatives:]
-for solver in solvers:
-    cumulative_distribution[solver] = cumulative_distribution[solver][num_any_negatives:]
+# Calculate the cumulative distribution of every solver at once
+num_runs = len(instances) * len(seeds)
+num_meeting_target = count_by_solver(igd_runs_df, igd_values <= target_deviation, igd_solvers)
+cumulative_distribution = coverage_fraction(num_meeting_target, num_with_data, num_runs, partial_coverage)
 
 # Convert the cumulative distribution to a DataFrame for easier plotting
-cumulative_distribution_df = pd.DataFrame(cumulative_distribution, index=time_values)
+cumulative_distribution_df = pd.DataFrame(cumulative_distribution.T, index=time_values, columns=igd_solvers)
 
 cumulative_distribution_df.to_csv('igd_snapshots.csv')
 
 # Plot the performance profile
-plt.figure()
-plt.xlabel('Time')
-plt.ylabel('Fraction of Executions')
-plt.grid(alpha=0.5, color='gray', linestyle='dashed', linewidth=0.5, which='both')
-for i in range(len(solvers)):
-    plt.plot(cumulative_distribution_df.index, cumulative_distribution_df[solvers[i]], label=solvers[i], marker = (i + 3, 2, 0), color = colors[i], alpha = 0.80)
-plt.xscale("log")
-plt.yscale("function", functions=(partial(np.power, 10.0), np.log10))
-plt.legend(loc='best')
-plt.gca().xaxis.set_major_formatter(FormatStrFormatter('%d'))
-plt.gca().yaxis.set_major_formatter(FormatStrFormatter('%.1f'))
-plt.tight_layout()
-# Save the plot
-plt.savefig('igd_snapshots.png')
-plt.close()
\ No newline at end of file
+render(['igd_snapshots'], ['png'], composites=False, data={'igd_snapshots': cumulative_distribution_df})
@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+    engine = 'pyarrow'
+except ImportError:
+    engine = 'c'
+
+# Declared columns of metrics.csv and metrics_snapshots.csv. Names are read as categoricals, seeds
+# as integers and times and values as floats; the instance description columns are only read on request.
+metrics_schema = {
+    'problem': 'category',
+    'instance': 'category',
+    'number of objectives': 'int64',
+    'chromosome size': 'int64',
+    'solver': 'category',
+    'seed': 'int64',
+    'metric name': 'category',
+    'metric value': 'float64',
+}
+snapshots_schema = {**metrics_schema, 'snapshot time': 'float64'}
+default_columns = ['problem', 'instance', 'solver', 'seed', 'metric name', 'metric value', 'snapshot time']
+
+# Columns identifying a run; every metric must have one for every solver, instance and seed
+run_key = ['metric name', 'solver', 'instance', 'seed']
+
+# Number of missing runs or bad lines quoted in an error
+max_reported = 5
+
+
+def read_header(filename: str) -> list[str]:
+    return list(pd.read_csv(filename, nrows=0).columns)
+
+
+# Schema of a file, from its header, restricted to the requested columns
+def schema_of(filename: str, columns: list[str] | None = None) -> dict[str, str]:
+    header = read_header(filename)
+    schema = snapshots_schema if 'snapshot time' in header else metrics_schema
+    columns = [column for column in (columns or default_columns) if column in schema]
+    missing = [column for column in columns + run_key if column not in header]
+    if missing:
+        raise ValueError(f'{filename}: missing columns {sorted(set(missing))}, expected the columns {list(schema)}')
+    return {column: schema[column] for column in schema if column in columns or column in run_key}
+
+
+# Explains why a file does not parse with its declared types: reads it again as strings, chunk by
+# chunk, and reports the first lines with a missing value, a non-numeric value or a non-integer seed
+def diagnose(filename: str, schema: dict[str, str], chunksize: int = 1_000_000):
+    messages = []
+    first_line = 2
+    for raw_chunk in pd.read_csv(filename, usecols=list(schema), dtype=str, keep_default_na=False, chunksize=chunksize):
+        for column, dtype in schema.items():
+            text = raw_chunk[column].str.strip()
+            missing = text == ''
+            bad = {f"missing value in column '{column}'": missing}
+            if dtype != 'category':
+                numbers = pd.to_numeric(text.where(~missing), errors='coerce')
+                bad[f"non-numeric value in column '{column}'"] = ~missing & numbers.isna()
+                if dtype == 'int64':
+                    bad[f"non-integer value in column '{column}'"] = numbers.notna() & (numbers != np.round(numbers))
+            for message, rows in bad.items():
+                for position in np.flatnonzero(rows.to_numpy()):
+                    messages.append((first_line + position, f'{message}: {raw_chunk.iloc[position].to_dict()}'))
+        if len(messages) >= max_reported:
+            break
+        first_line += len(raw_chunk)
+    if messages:
+        raise ValueError(f'{filename}: malformed rows\n' + '\n'.join(f'line {line}: {message}' for line, message in sorted(messages)[:max_reported]))
+
+
+# Empty fields of a parsed block, as lines counting the header as line 1
+def check_missing(df: pd.DataFrame, filename: str, first_line: int):
+    missing = df.isna()
+    if missing.any().any():
+        lines = first_line + np.flatnonzero(missing.any(axis=1).to_numpy())
+        raise ValueError(f'{filename}: missing values in columns {list(missing.columns[missing.any()])} on lines {lines[:max_reported].tolist()}')
+
+
+def parse(filename: str, schema: dict[str, str], **kwargs) -> pd.DataFrame:
+    return pd.read_csv(filename, usecols=list(schema), dtype=schema, **kwargs)
+
+
+# Runs missing from a table of runs: a metric should have every solver on every instance with every seed
+def missing_runs(runs_df: pd.DataFrame) -> pd.DataFrame:
+    missing = []
+    for metric_name, metric_runs_df in runs_df[run_key].astype(object).groupby('metric name'):
+        expected = pd.MultiIndex.from_product([metric_runs_df[column].unique() for column in run_key[1:]], names=run_key[1:])
+        present = pd.MultiIndex.from_frame(metric_runs_df[run_key[1:]])
+        missing.append(expected.difference(present).to_frame(index=False).assign(**{'metric name': metric_name}))
+    if len(missing) == 0:
+        return pd.DataFrame(columns=run_key)
+    return pd.concat(missing, ignore_index=True)[run_key]
+
+
+def check_complete(runs_df: pd.DataFrame, filename: str):
+    missing_df = missing_runs(runs_df)
+    for metric_name, metric_missing_df in missing_df.groupby('metric name'):
+        quoted = ', '.join(str(run) for run in metric_missing_df[run_key[1:]].head(max_reported).itertuples(index=False, name=None))
+        raise ValueError(f"{filename}: {len(metric_missing_df)} (solver, instance, seed) runs of '{metric_name}' are missing, e.g. {quoted}")
+
+
+def check_duplicates(df: pd.DataFrame, filename: str):
+    key = run_key + (['snapshot time'] if 'snapshot time' in df.columns else [])
+    duplicated = df.duplicated(key)
+    if duplicated.any():
+        raise ValueError(f'{filename}: {int(duplicated.sum())} rows repeat a {tuple(key)}, e.g. {df[duplicated].iloc[0][key].to_dict()}')
+
+
+# Reads metrics.csv or metrics_snapshots.csv with their declared types, only the given columns (the
+# ones the analyses use by default) and the fastest available parser. Malformed rows, repeated rows
+# and, unless require_complete is False, missing runs raise a ValueError naming them.
+def read(filename: str, columns: list[str] | None = None, require_complete: bool = True) -> pd.DataFrame:
+    schema = schema_of(filename, columns)
+    try:
+        df = parse(filename, schema, engine=engine)
+    except (ValueError, TypeError):
+        diagnose(filename, schema)
+        raise
+    check_missing(df, filename, 2)
+    check_duplicates(df, filename)
+    if require_complete:
+        check_complete(df[run_key].drop_duplicates(), filename)
+    return df
+
+
+# Same as read, chunk by chunk, for files that do not fit in memory. Every chunk is checked as it is
+# parsed, repeated rows are found within a chunk, and the runs are checked for completeness once the
+# last chunk has been read.
+def iter_chunks(filename: str, chunksize: int, columns: list[str] | None = None, require_complete: bool = True):
+    schema = schema_of(filename, columns)
+    runs = []
+    first_line = 2
+    # Chunked reads need the C parser. As in read, only parse errors are diagnosed, not the checks or
+    # the errors the caller raises while a chunk is yielded.
+    reader = parse(filename, schema, chunksize=chunksize)
+    while True:
+        try:
+            chunk = next(reader)
+        except StopIteration:
+            break
+        except (ValueError, TypeError):
+            diagnose(filename, schema, chunksize)
+            raise
+        check_missing(chunk, filename, first_line)
+        check_duplicates(chunk, filename)
+        first_line += len(chunk)
+        if require_complete:
+            runs.append(chunk[run_key].astype(object).drop_duplicates())
+        yield chunk
+    if require_complete and runs:
+        check_complete(pd.concat(runs, ignore_index=True).drop_duplicates(), filename)
@@ -0,0 +1,148 @@
+from render import render
+from registry import metrics as registered_metrics, solver_order
+from run_coverage import coverage_fraction, coverage_index, expected_runs, runs_with_data, valid_time_window
+from time_grid import align_to_grid, run_columns, time_grid
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import ingest
+
+# Metrics and whether their best value is the max or the min
+metrics = {key: (metric['name'], metric['direction']) for key, metric in registered_metrics.items()}
+
+# Conjunctions of per-metric targets: a run meets one when it meets the target of every metric
+joint_targets = {
+    variant: {key: metric['targets'][variant] for key, metric in registered_metrics.items()}
+    for variant in ('easy', 'hard')
+}
+
+# Shared time grid of all the metrics
+time_grid_kind = 'log'
+num_times = 200
+given_time_values = None
+interpolation = 'step'
+
+# Estimate the fractions over the runs that have data at each time, instead of only from the time
+# every run has data on
+partial_coverage = False
+
+
+# Aligns every metric of every run on the time grid in one pass, into a
+# (metric x solver x instance x seed x time) array. Runs missing from the file are NaN.
+def snapshot_tensor(snapshots_df: pd.DataFrame, time_values: np.ndarray) -> tuple[list[str], list[str], np.ndarray, np.ndarray, np.ndarray]:
+    runs_df, values = align_to_grid(snapshots_df, time_values, interpolation, columns=['metric name'] + run_columns)
+    metric_names = [metric_name for metric_name, _ in metrics.values()]
+    tensor_solvers = solver_order(runs_df['solver'].unique())
+    instances, instance_of_run = np.unique(runs_df['instance'].to_numpy(dtype=str), return_inverse=True)
+    seeds, seed_of_run = np.unique(runs_df['seed'].to_numpy(), return_inverse=True)
+    metric_of_run = runs_df['metric name'].map({metric_name: i for i, metric_name in enumerate(metric_names)}).to_numpy()
+    solver_of_run = runs_df['solver'].map({solver: i for i, solver in enumerate(tensor_solvers)}).to_numpy()
+
+    tensor = np.full((len(metric_names), len(tensor_solvers), len(instances), len(seeds), len(time_values)), np.nan)
+    tensor[metric_of_run, solver_of_run, instance_of_run, seed_of_run] = values
+    return metric_names, tensor_solvers, instances, seeds, tensor
+
+
+# Number of the (instance, seed) runs of each solver meeting every target at each time
+def num_meeting_joint_target(tensor: np.ndarray, targets: dict[str, float]) -> np.ndarray:
+    directions = np.array([direction for _, direction in metrics.values()])[:, None, None, None, None]
+    target_values = np.array([targets[name] for name in metrics])[:, None, None, None, None]
+    with np.errstate(invalid='ignore'):
+        meets = np.where(directions == 'max', tensor >= target_values, tensor <= target_values).all(axis=0)
+    return meets.sum(axis=(1, 2))
+
+
+# Coverage of the runs on all the metrics at once: a run has data from the first time every metric has
+# data on, and runs lacking a metric count as missing
+def joint_coverage_index(snapshots_df: pd.DataFrame) -> pd.DataFrame:
+    coverage_df = coverage_index(snapshots_df)
+    joint_coverage_df = coverage_df.groupby(run_columns, observed=True).agg(**{'first time': ('first time', 'max'), 'last time': ('last time', 'min'), 'metrics': ('metric name', 'size')})
+    return joint_coverage_df[joint_coverage_df['metrics'] == len(metrics)].reset_index()
+
+
+# Rank of every solver on every (metric, instance, seed, time), 1 for the best, ties sharing the
+# average of their ranks. NaN where some solver has no data.
+def solver_ranks(tensor: np.ndarray) -> np.ndarray:
+    directions = np.array([direction for _, direction in metrics.values()])[:, None, None, None, None]
+    key = np.where(directions == 'max', -tensor, tensor)
+    a, b = key[:, :, None], key[:, None, :]
+    ranks = (b < a).sum(axis=2) + ((b == a).sum(axis=2) + 1) / 2
+    return np.where(np.isnan(tensor).any(axis=1, keepdims=True), np.nan, ranks)
+
+
+# Kendall's coefficient of concordance of the metrics, used as raters of the solvers, on every
+# (instance, seed, time): 1 when all metrics rank the solvers the same way, 0 when they are unrelated
+def kendall_w(ranks: np.ndarray) -> np.ndarray:
+    num_metrics, num_solvers = ranks.shape[:2]
+    rank_sums = ranks.sum(axis=0)
+    spread = ((rank_sums - rank_sums.mean(axis=0, keepdims=True)) ** 2).sum(axis=0)
+    return 12.0 * spread / (num_metrics ** 2 * (num_solvers ** 3 - num_solvers))
+
+
+# Pareto-style comparison: fraction of the paired (instance, seed) runs on which solver a is at
+# least as good as solver b on every metric and strictly better on one, at each time
+def joint_dominance(tensor: np.ndarray) -> np.ndarray:
+    directions = np.array([direction for _, direction in metrics.values()])[:, None, None, None, None]
+    key = np.where(directions == 'max', tensor, -tensor)
+    a, b = key[:, :, None], key[:, None, :]
+    dominates = (a >= b).all(axis=0) & (a > b).any(axis=0)
+    paired = ~(np.isnan(a) | np.isnan(b)).any(axis=0)
+    return dominates.sum(axis=(2, 3)) / np.maximum(paired.sum(axis=(2, 3)), 1)
+
+
+# Mean over the values that are not NaN, NaN where there are none
+def mean_with_data(values: np.ndarray, axis: tuple[int, ...]) -> np.ndarray:
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.nansum(values, axis=axis) / np.sum(~np.isnan(values), axis=axis)
+
+
+def main():
+    # Load the data once for every metric
+    metrics_snapshots_filename = 'metrics_snapshots.csv'
+    metrics_snapshots_df = ingest.read(metrics_snapshots_filename, columns=['metric name'] + run_columns + ['snapshot time', 'metric value'], require_complete=not partial_coverage)
+    metrics_snapshots_df = metrics_snapshots_df[metrics_snapshots_df['metric name'].isin([metric_name for metric_name, _ in metrics.values()])]
+
+    time_values = time_grid(metrics_snapshots_df, time_grid_kind, num_times, given_time_values)
+    metric_names, tensor_solvers, instances, seeds, tensor = snapshot_tensor(metrics_snapshots_df, time_values)
+    joint_coverage_df = joint_coverage_index(metrics_snapshots_df)
+    window_start, _ = valid_time_window(joint_coverage_df, partial_coverage)
+    in_window = time_values >= window_start
+    num_with_data = runs_with_data(joint_coverage_df, time_values, tensor_solvers).to_numpy().T
+
+    for variant, targets in joint_targets.items():
+        fraction = coverage_fraction(num_meeting_joint_target(tensor, targets), num_with_data, expected_runs(joint_coverage_df), partial_coverage)
+        cumulative_distribution_df = pd.DataFrame(fraction.T, index=time_values, columns=tensor_solvers)[in_window]
+        cumulative_distribution_df.to_csv('joint_snapshots_' + variant + '.csv')
+        render(['joint_snapshots_' + variant], ['png'], composites=False, data={'joint_snapshots_' + variant: cumulative_distribution_df})
+
+    # Mean rank of every solver under every metric, and how much the metrics agree, over time
+    ranks = solver_ranks(tensor)
+    mean_ranks = mean_with_data(ranks, axis=(2, 3))
+    agreement = mean_with_data(kendall_w(ranks), axis=(0, 1))
+    index = pd.MultiIndex.from_product([list(metrics), tensor_solvers], names=['metric', 'solver'])
+    mean_ranks_df = pd.DataFrame(mean_ranks.reshape(-1, len(time_values)), index=index, columns=time_values).T
+    mean_ranks_df.index.name = 'time'
+    mean_ranks_df.to_csv('joint_mean_ranks.csv')
+    agreement_df = pd.DataFrame({'kendall w': agreement}, index=pd.Index(time_values, name='time'))
+    agreement_df.to_csv('joint_rank_agreement.csv')
+
+    dominance = joint_dominance(tensor)
+    index = pd.MultiIndex.from_product([tensor_solvers, tensor_solvers], names=['solver a', 'solver b'])
+    dominance_df = pd.DataFrame(dominance.reshape(-1, len(time_values)), index=index, columns=time_values).T
+    dominance_df.index.name = 'time'
+    dominance_df.to_csv('joint_dominance.csv')
+
+    # Plot the agreement of the metrics over time
+    plt.figure()
+    plt.xlabel('Time')
+    plt.ylabel("Kendall's W of the solver ranks")
+    plt.grid(alpha=0.5, color='gray', linestyle='dashed', linewidth=0.5, which='both')
+    plt.plot(agreement_df.index, agreement_df['kendall w'])
+    plt.xscale('log')
+    plt.ylim(0.0, 1.0)
+    plt.savefig('joint_rank_agreement.png')
+    plt.close()
+
+
+if __name__ == '__main__':
+    main()
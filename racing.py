@@ -0,0 +1,271 @@
+from grouped import performance_profile
+from registry import metrics, solver_order
+from run_coverage import coverage_index
+from time_grid import run_columns
+from watch_snapshots import OnlineRunLengthECDF, SnapshotTail, default_suffix
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+import ingest
+
+try:
+    from scipy import stats
+except ImportError:
+    stats = None
+
+# Metric the solvers race on, and the log-spaced checkpoint times at which every instance is tested
+race_metric = 'hvr'
+time_min = 60.0
+time_max = 3600.0
+num_checkpoints = 20
+
+# Significance level of the Friedman test and of its post-hoc comparisons, and the fewest seeds with
+# data for every remaining solver before an instance is tested
+alpha = 0.05
+min_blocks = 5
+
+# Number of log-spaced batches the replay feeds the snapshot rows in, in time order
+replay_batches = 200
+
+stops_filename = 'racing_stops.csv'
+
+
+class RacingECDF(OnlineRunLengthECDF):
+    # Run-length ECDF that also keeps the value of every run at every checkpoint. A checkpoint takes
+    # the latest snapshot at or before it, the grid times the ECDF settles.
+
+    def __init__(self, metric_name: str, direction: str, target_value: float, time_values: np.ndarray):
+        super().__init__(metric_name, direction, target_value, time_values)
+        self.checkpoint_values = np.full((0, len(self.time_values)), np.nan)
+
+    def _add_runs(self, keys: list[tuple[str, str, int]]):
+        num_runs = len(self.run_index)
+        super()._add_runs(keys)
+        self.checkpoint_values = np.vstack([self.checkpoint_values, np.full((len(self.run_index) - num_runs, len(self.time_values)), np.nan)])
+
+    def _settle(self, run: np.ndarray, lo: np.ndarray, hi: np.ndarray, value: np.ndarray):
+        super()._settle(run, lo, hi, value)
+        length = hi - lo
+        segment_start = np.repeat(np.cumsum(length) - length, length)
+        checkpoint = np.repeat(lo, length) + np.arange(length.sum()) - segment_start
+        self.checkpoint_values[np.repeat(run, length), checkpoint] = np.repeat(value, length)
+
+    # Value of every run at checkpoint k, NaN for runs that have not reached it or started after it.
+    # A snapshot exactly at the checkpoint is not settled until the next one arrives.
+    def values_at(self, k: int) -> np.ndarray:
+        values = self.checkpoint_values[:, k]
+        return np.where(np.isnan(values) & (self.last_time == self.time_values[k]), self.last_value, values)
+
+
+# One F-race step on a batch of instances: a Friedman test of the remaining solvers with the seeds as
+# blocks, and where it rejects, Conover's post-hoc comparison of every solver with the best one.
+# Values are (instance x seed x solver), larger is better; seeds lacking a remaining solver are left out.
+# Returns the solvers to eliminate and the p-values of the Friedman tests (NaN where not tested).
+def race_step(values: np.ndarray, alive: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    if stats is None:
+        raise ImportError('racing requires scipy for the Friedman test')
+    values = np.where(alive[:, None, :], values, np.nan)
+    block_ok = (~np.isnan(values) | ~alive[:, None, :]).all(axis=2)
+
+    # Rank of every remaining solver within each seed, ties sharing the average rank, 1 for the worst
+    a, b = values[:, :, :, None], values[:, :, None, :]
+    ranks = (b < a).sum(axis=3) + ((b == a).sum(axis=3) + 1) / 2
+    ranks = np.where(alive[:, None, :] & block_ok[:, :, None], ranks, 0.0)
+
+    num_blocks = block_ok.sum(axis=1)
+    num_alive = alive.sum(axis=1)
+    rank_sums = ranks.sum(axis=1)
+    sum_squares = (ranks ** 2).sum(axis=(1, 2))
+    correction = num_blocks * num_alive * (num_alive + 1) ** 2 / 4
+    spread = np.where(alive, (rank_sums - (num_blocks * (num_alive + 1) / 2)[:, None]) ** 2, 0.0).sum(axis=1)
+    testable = (num_blocks >= min_blocks) & (num_alive >= 2) & (sum_squares > correction)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        statistic = (num_alive - 1) * spread / (sum_squares - correction)
+        p_values = np.where(testable, stats.chi2.sf(statistic, num_alive - 1), np.nan)
+        degrees = (num_blocks - 1) * (num_alive - 1)
+        critical = stats.t.ppf(1 - alpha / 2, degrees) * np.sqrt(np.maximum(2 * num_blocks * (sum_squares - correction) / degrees * (1 - statistic / (num_blocks * (num_alive - 1))), 0.0))
+    best = np.where(alive, rank_sums, -np.inf).max(axis=1)
+    eliminated = (testable & (p_values < alpha))[:, None] & alive & (best[:, None] - rank_sums > critical[:, None])
+    return eliminated, p_values
+
+
+class RaceAdvisor:
+    # Races the solvers on every instance as snapshot rows come in. Once every run of the remaining
+    # solvers on an instance has reached a checkpoint, the instance is tested at that checkpoint, and
+    # the solvers that are significantly behind are reported: their runs on the instance can stop.
+
+    def __init__(self, metric: str = race_metric, checkpoints: np.ndarray | None = None):
+        if checkpoints is None:
+            checkpoints = np.geomspace(time_min, time_max, num_checkpoints)
+        self.metric = metric
+        self.direction = metrics[metric]['direction']
+        self.checkpoints = np.asarray(checkpoints, dtype=float)
+        self.ecdf = RacingECDF(metrics[metric]['name'], '>=' if self.direction == 'max' else '<=', metrics[metric]['targets']['easy'], self.checkpoints)
+        self.next_checkpoint: dict[str, int] = {}
+        self.eliminated: dict[str, set[str]] = {}
+        self.stops: list[dict] = []
+
+    def update(self, rows: pd.DataFrame):
+        self.ecdf.update(rows)
+
+    # Tests every instance at every checkpoint it is ready for and returns the new stops
+    def advance(self) -> list[dict]:
+        num_stops = len(self.stops)
+        if len(self.ecdf.run_index) == 0:
+            return []
+        runs_df = pd.DataFrame(list(self.ecdf.run_index), columns=run_columns)
+        race_solvers = solver_order(runs_df['solver'].unique())
+        solver_of_run = runs_df['solver'].map({solver: i for i, solver in enumerate(race_solvers)}).to_numpy()
+        instances, instance_of_run = np.unique(runs_df['instance'].to_numpy(dtype=str), return_inverse=True)
+        _, seed_of_run = np.unique(runs_df['seed'].to_numpy(), return_inverse=True)
+
+        # Solvers with runs on an instance and not eliminated from it
+        alive = np.zeros((len(instances), len(race_solvers)), dtype=bool)
+        alive[instance_of_run, solver_of_run] = True
+        for i, instance in enumerate(instances):
+            alive[i, [race_solvers.index(solver) for solver in self.eliminated.get(instance, ())]] = False
+        next_checkpoint = np.array([self.next_checkpoint.get(instance, 0) for instance in instances])
+
+        while True:
+            racing = (next_checkpoint < len(self.checkpoints)) & (alive.sum(axis=1) >= 2)
+            if not racing.any():
+                break
+            # Instances whose remaining runs have all reached their next checkpoint
+            checkpoint_of_run = np.minimum(next_checkpoint[instance_of_run], len(self.checkpoints) - 1)
+            behind = alive[instance_of_run, solver_of_run] & ~(self.ecdf.last_time >= self.checkpoints[checkpoint_of_run])
+            ready = racing & (np.bincount(instance_of_run[behind], minlength=len(instances)) == 0)
+            if not ready.any():
+                break
+            for k in np.unique(next_checkpoint[ready]):
+                tested = np.flatnonzero(ready & (next_checkpoint == k))
+                values = np.full((len(instances), seed_of_run.max() + 1, len(race_solvers)), np.nan)
+                values[instance_of_run, seed_of_run, solver_of_run] = self.ecdf.values_at(k) if self.direction == 'max' else -self.ecdf.values_at(k)
+                eliminated, p_values = race_step(values[tested], alive[tested])
+                for row, solver in zip(*np.nonzero(eliminated)):
+                    instance = instances[tested[row]]
+                    self.eliminated.setdefault(instance, set()).add(race_solvers[solver])
+                    self.stops.append({'instance': instance, 'solver': race_solvers[solver], 'checkpoint': self.checkpoints[k], 'decision time': self.ecdf.now, 'p-value': p_values[row]})
+                alive[tested] &= ~eliminated
+                next_checkpoint[tested] += 1
+        self.next_checkpoint.update(zip(instances, next_checkpoint.tolist()))
+        return self.stops[num_stops:]
+
+
+# Value of every metric of every run at the end of the run, or at the time it was stopped
+def final_values(snapshots_df: pd.DataFrame, stop_time: pd.Series | None = None) -> pd.DataFrame:
+    if stop_time is not None:
+        snapshots_df = snapshots_df[snapshots_df['snapshot time'].to_numpy() <= stop_time.to_numpy()]
+    last = snapshots_df.sort_values('snapshot time').groupby(['metric name'] + run_columns, observed=True).tail(1)
+    return last.reset_index(drop=True)
+
+
+# Ranking of the solvers in the profile of every metric: by the geometric mean deviation from the
+# best value of the instance, which orders the solvers by the area under their profile on the log
+# deviation axis. Also returns the profile of every metric.
+def profile_rankings(values_df: pd.DataFrame) -> tuple[pd.DataFrame, dict[str, pd.DataFrame]]:
+    rankings, profiles = [], {}
+    for key, metric in metrics.items():
+        metric_df = values_df[values_df['metric name'] == metric['name']]
+        if metric_df.empty:
+            continue
+        best_value = metric_df.groupby('instance', observed=True)['metric value'].transform(metric['direction'])
+        ratio_df = metric_df.assign(**{'metric value': best_value / metric_df['metric value'] if metric['direction'] == 'max' else metric_df['metric value'] / best_value})
+        profiles[key] = performance_profile(ratio_df)
+        mean_log_ratio = np.log(ratio_df['metric value']).groupby(ratio_df['solver'].astype(str)).mean()
+        mean_log_ratio = mean_log_ratio.reindex(solver_order(mean_log_ratio.index))
+        ranking_df = np.exp(mean_log_ratio).rename('geometric mean ratio').reset_index()
+        ranking_df['rank'] = ranking_df['geometric mean ratio'].rank(method='min').astype(int)
+        rankings.append(ranking_df.assign(metric=key))
+    return pd.concat(rankings, ignore_index=True), profiles
+
+
+# Feeds a snapshot file to the advisor in time order, as if the runs were being watched, and reports
+# the stops, the compute each solver would have saved and the rankings of the profiles with and
+# without racing. A run stops when the decision is made, at the end of the batch it was made in, so
+# the savings are a lower bound.
+def replay(snapshots_filename: str, advisor: RaceAdvisor) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    snapshots_df = ingest.read(snapshots_filename, require_complete=False)
+    snapshots_df = snapshots_df.sort_values('snapshot time', kind='stable', ignore_index=True)
+    rows_df = snapshots_df.astype({column: str for column in ['instance', 'solver', 'metric name']})
+    snapshot_time = rows_df['snapshot time'].to_numpy()
+    batch_ends = np.searchsorted(snapshot_time, np.geomspace(max(snapshot_time[0], 1e-9), snapshot_time[-1], replay_batches), side='right')
+    start = 0
+    for end in np.unique(np.append(batch_ends, len(rows_df))):
+        if end > start:
+            advisor.update(rows_df.iloc[start:end])
+            advisor.advance()
+            start = end
+    stops_df = pd.DataFrame(advisor.stops, columns=['instance', 'solver', 'checkpoint', 'decision time', 'p-value'])
+
+    # Compute of every run: up to its last snapshot, or to its stop
+    stop_of_pair = stops_df.set_index(['instance', 'solver'])['decision time']
+    runs_df = coverage_index(snapshots_df).groupby(run_columns, observed=True)['last time'].max().rename('full time').reset_index()
+    runs_df['stop time'] = pd.MultiIndex.from_frame(runs_df[['instance', 'solver']].astype(str)).map(stop_of_pair).to_numpy(dtype=float)
+    runs_df['raced time'] = np.fmin(runs_df['full time'], runs_df['stop time'])
+    savings_df = runs_df.groupby('solver', observed=True).agg(**{'runs': ('full time', 'size'), 'stopped runs': ('stop time', 'count'), 'full time': ('full time', 'sum'), 'raced time': ('raced time', 'sum')})
+    savings_df = savings_df.reindex(solver_order(savings_df.index))
+    savings_df.loc['total'] = savings_df.sum()
+    savings_df = savings_df.astype({'runs': int, 'stopped runs': int})
+    savings_df['saved fraction'] = 1.0 - savings_df['raced time'] / savings_df['full time']
+
+    # Final values with and without racing, and the rankings of their profiles
+    stop_time = pd.MultiIndex.from_frame(snapshots_df[['instance', 'solver']].astype(str)).map(stop_of_pair).to_series(index=snapshots_df.index).fillna(np.inf)
+    full_rankings_df, full_profiles = profile_rankings(final_values(snapshots_df))
+    raced_rankings_df, raced_profiles = profile_rankings(final_values(snapshots_df, stop_time))
+    rankings_df = full_rankings_df.merge(raced_rankings_df, on=['metric', 'solver'], suffixes=(' full', ' raced'))
+    rankings_df['largest profile change'] = [
+        (raced_profiles[key][solver].reindex(grid, method='ffill').fillna(0.0) - full_profiles[key][solver].reindex(grid, method='ffill').fillna(0.0)).abs().max()
+        for key, solver in zip(rankings_df['metric'], rankings_df['solver'])
+        for grid in [np.union1d(full_profiles[key].index, raced_profiles[key].index)]
+    ]
+    return stops_df, savings_df.reset_index(), rankings_df[['metric', 'solver', 'geometric mean ratio full', 'geometric mean ratio raced', 'rank full', 'rank raced', 'largest profile change']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Race the solvers on every instance from their snapshots and advise which runs can stop early.')
+    parser.add_argument('mode', choices=['watch', 'replay'], help="'watch' growing snapshot files, or 'replay' a finished snapshot file")
+    parser.add_argument('--snapshots', default=None, help="file or glob pattern, by default 'metrics_snapshots*.csv' to watch and 'metrics_snapshots.csv' to replay")
+    parser.add_argument('--metric', default=race_metric, choices=list(metrics))
+    parser.add_argument('--time-min', type=float, default=time_min, help='first checkpoint')
+    parser.add_argument('--time-max', type=float, default=time_max, help='last checkpoint')
+    parser.add_argument('--num-checkpoints', type=int, default=num_checkpoints)
+    parser.add_argument('--poll', type=float, default=2.0, help='seconds between reads of the snapshot files')
+    args = parser.parse_args()
+
+    advisor = RaceAdvisor(args.metric, np.geomspace(args.time_min, args.time_max, args.num_checkpoints))
+    if args.mode == 'replay':
+        stops_df, savings_df, rankings_df = replay(args.snapshots or 'metrics_snapshots.csv', advisor)
+        stops_df.to_csv('racing_replay_stops.csv', index=False)
+        savings_df.to_csv('racing_replay_savings.csv', index=False)
+        rankings_df.to_csv('racing_replay_rankings.csv', index=False)
+        print(f'{len(stops_df)} (solver, instance) pairs stopped')
+        print(savings_df.to_string(index=False))
+        for key, metric_rankings_df in rankings_df.groupby('metric', sort=False):
+            changed = (metric_rankings_df['rank full'] != metric_rankings_df['rank raced']).any()
+            print(f"{metrics[key]['name']}: ranking {'changes' if changed else 'unchanged'}, largest profile change {metric_rankings_df['largest profile change'].max():.3f}")
+        return
+
+    # Watch: report every new stop as soon as it is decided, appended to the stops file
+    # The default pattern also matches the outputs of a watcher running alongside, which are skipped
+    tail = SnapshotTail(args.snapshots or 'metrics_snapshots*.csv', exclude_suffix=default_suffix)
+    try:
+        while True:
+            rows = tail.read_new_rows()
+            if not rows.empty:
+                advisor.update(rows)
+                stops = advisor.advance()
+                if stops:
+                    stops_df = pd.DataFrame(stops)
+                    stops_df.to_csv(stops_filename, mode='a', header=not os.path.exists(stops_filename), index=False)
+                    for stop in stops:
+                        print(f"stop {stop['solver']} on {stop['instance']}: behind at time {stop['checkpoint']:g} (p = {stop['p-value']:.2g})")
+            time.sleep(args.poll)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Registry of the solvers and metrics of the benchmark. Registered solvers come first, in this order,
+# with their label and color; solvers found in the data but not registered follow in name order and
+# take the next styles of the cycle, so any number of solvers can be plotted without editing this file.
+solvers = ["NSGA-II", "NSPSO", "MOEA/D-DE", "MHACO", "IHS", "NS-BRKGA"]
+solver_labels: dict[str, str] = {}
+colors = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf", "#8c7e6e", "#738191"]
+# Markers are regular polygons with 3 to 9 sides; with 12 colors every (color, marker) pair up to 84
+# solvers is distinct
+num_markers = 7
+
+# Metrics by short name: name in the data, whether the best value is the max or the min, axis label,
+# value targets of the easy and hard run-length curves and deviation target of the deviation curve
+metrics = {
+    'hvr': {
+        'name': 'Hypervolume Ratio',
+        'direction': 'max',
+        'label': 'Hypervolume Ratio',
+        'targets': {'easy': 0.60, 'hard': 0.80},
+        'target deviation': 1.5910459872928635,
+    },
+    'igd': {
+        'name': 'Modified Inverted Generational Distance',
+        'direction': 'min',
+        'label': 'Modified Inverted Generational Distance',
+        'targets': {'easy': 0.05, 'hard': 0.01},
+        'target deviation': 9.748801264859514,
+    },
+    'epsilon': {
+        'name': 'Multiplicative Epsilon Indicator',
+        'direction': 'max',
+        'label': 'Multiplicative Epsilon Indicator',
+        'targets': {'easy': 0.60, 'hard': 0.80},
+        'target deviation': 1.5736641956206494,
+    },
+}
+
+# Optional overrides, e.g. {"solvers": [...], "solver labels": {...}, "colors": [...], "metrics": {"hvr": {...}}}
+registry_filename = 'registry.json'
+
+if os.path.exists(registry_filename):
+    with open(registry_filename) as file:
+        config = json.load(file)
+    solvers = config.get('solvers', solvers)
+    solver_labels.update(config.get('solver labels', {}))
+    colors = config.get('colors', colors)
+    for key, metric in config.get('metrics', {}).items():
+        metrics[key] = {**metrics.get(key, {}), **metric}
+
+
+# Registered solvers in registry order, then the others by name
+def solver_order(names) -> list[str]:
+    names = list(dict.fromkeys(str(name) for name in names))
+    return [solver for solver in solvers if solver in names] + sorted(solver for solver in names if solver not in solvers)
+
+
+# Label, color and marker of a solver. Registered solvers keep their style in every figure; the
+# others of a figure take the next styles, in name order.
+def solver_style(solver: str, figure_solvers) -> dict:
+    others = sorted(name for name in set(map(str, figure_solvers)) if name not in solvers)
+    i = solvers.index(solver) if solver in solvers else len(solvers) + others.index(solver)
+    return {'label': solver_labels.get(solver, solver), 'color': colors[i % len(colors)], 'marker': (i % num_markers + 3, 2, 0)}
+
+
+# Short name of a metric from its name in the data
+def metric_key(metric_name: str) -> str:
+    for key, metric in metrics.items():
+        if metric['name'] == metric_name:
+            return key
+    raise KeyError(f"metric '{metric_name}' is not registered, add it to {registry_filename}")
+
+
+# Position of every row's solver in the given solvers, for grouped array operations
+def solver_codes(solver_column: pd.Series, group_solvers: list[str]) -> np.ndarray:
+    return pd.Categorical(solver_column.astype(str), categories=group_solvers).codes.astype(np.int64)
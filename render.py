@@ -0,0 +1,146 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from matplotlib.ticker import FormatStrFormatter
+from registry import solver_order, solver_style
+import argparse
+import hashlib
+import json
+import os
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+# Power y axis shared by every figure, built once
+y_functions = (partial(np.power, 10.0), np.log10)
+
+# Every figure: x label, x tick format (None keeps matplotlib's minor ticks) and marker spacing
+time_figure = {'xlabel': 'Time', 'x_format': '%d', 'x_minor_format': None, 'markevery': None}
+figures = {
+    'hvr': {'xlabel': 'Deviation from best Hypervolume Ratio', 'x_format': '%.1f', 'x_minor_format': '%.1f', 'markevery': 0.02},
+    'igd': {'xlabel': 'Deviation from best Modified Inverted Generational Distance', 'x_format': '%d', 'x_minor_format': '%d', 'markevery': 0.02},
+    'epsilon': {'xlabel': 'Deviation from best Multiplicative Epsilon Indicator', 'x_format': '%.1f', 'x_minor_format': '%.1f', 'markevery': 0.02},
+    **{metric + '_snapshots' + variant: time_figure for metric in ['hvr', 'igd', 'epsilon'] for variant in ['', '_easy', '_hard']},
+    'joint_snapshots_easy': time_figure,
+    'joint_snapshots_hard': time_figure,
+}
+
+# Composite figures: one row per metric, one panel per figure of the metric
+panels = {
+    'hvr_panels': [['hvr', 'hvr_snapshots', 'hvr_snapshots_easy', 'hvr_snapshots_hard']],
+    'igd_panels': [['igd', 'igd_snapshots', 'igd_snapshots_easy', 'igd_snapshots_hard']],
+    'epsilon_panels': [['epsilon', 'epsilon_snapshots', 'epsilon_snapshots_easy', 'epsilon_snapshots_hard']],
+    'all_panels': [[metric + suffix for suffix in ['', '_snapshots', '_snapshots_easy', '_snapshots_hard']] for metric in ['hvr', 'igd', 'epsilon']],
+}
+
+# Series longer than this are rasterized, which keeps vector exports small
+rasterize_above = 1000
+
+render_cache_filename = '.render_cache.json'
+
+
+def plot_cumulative_distribution(ax, cumulative_distribution_df: pd.DataFrame, figure: dict, legend: bool = True):
+    ax.set_xlabel(figure['xlabel'])
+    ax.set_ylabel('Fraction of Executions')
+    ax.grid(alpha=0.5, color='gray', linestyle='dashed', linewidth=0.5, which='both')
+    rasterized = len(cumulative_distribution_df) > rasterize_above
+    figure_solvers = solver_order(cumulative_distribution_df.columns)
+    for solver in figure_solvers:
+        style = solver_style(solver, figure_solvers)
+        ax.plot(cumulative_distribution_df.index, cumulative_distribution_df[solver], label=style['label'], marker = style['marker'], color = style['color'], alpha = 0.80, markevery = figure['markevery'], rasterized = rasterized)
+    ax.set_xscale("log")
+    ax.set_yscale("function", functions=y_functions)
+    if legend:
+        ax.legend(loc='best')
+    if figure['x_minor_format'] is not None:
+        ax.xaxis.set_minor_formatter(FormatStrFormatter(figure['x_minor_format']))
+    ax.xaxis.set_major_formatter(FormatStrFormatter(figure['x_format']))
+    ax.yaxis.set_major_formatter(FormatStrFormatter('%.1f'))
+
+
+def load(name: str) -> pd.DataFrame:
+    return pd.read_csv(name + '.csv', index_col=0, float_precision='round_trip')
+
+
+# Hash of everything a figure is drawn from: its step data, its layout and the output format
+def data_hash(names: list[str], layout, data: dict[str, pd.DataFrame], output_format: str) -> str:
+    digest = hashlib.sha1(repr((names, layout, output_format, rasterize_above)).encode())
+    for name in names:
+        digest.update(pd.util.hash_pandas_object(data[name]).to_numpy().tobytes())
+        digest.update(repr(list(data[name].columns)).encode())
+    return digest.hexdigest()
+
+
+def read_render_cache() -> dict[str, str]:
+    if not os.path.exists(render_cache_filename):
+        return {}
+    with open(render_cache_filename) as file:
+        return json.load(file)
+
+
+def draw(output_filename: str, grid: list[list[str]], data: dict[str, pd.DataFrame]):
+    num_rows, num_columns = len(grid), max(len(row) for row in grid)
+    fig, axes = plt.subplots(num_rows, num_columns, figsize=(6.4 * num_columns, 4.8 * num_rows), squeeze=False)
+    for row, names in enumerate(grid):
+        for column, name in enumerate(names):
+            plot_cumulative_distribution(axes[row][column], data[name], figures[name], legend=(row == 0 and column == 0) or num_rows * num_columns == 1)
+        for column in range(len(names), num_columns):
+            axes[row][column].set_visible(False)
+    fig.tight_layout()
+    fig.savefig(output_filename)
+    plt.close(fig)
+    return output_filename
+
+
+# Figures whose hash changed, or whose output is missing, are drawn in parallel worker processes
+def render(names: list[str], formats: list[str], composites: bool = True, data: dict[str, pd.DataFrame] | None = None, workers: int | None = None, force: bool = False) -> list[str]:
+    data = dict(data or {})
+    jobs = [(name, [[name]]) for name in names]
+    if composites:
+        jobs += [(panel, grid) for panel, grid in panels.items() if all(name in names for row in grid for name in row)]
+    for _, grid in jobs:
+        for row in grid:
+            for name in row:
+                if name not in data:
+                    data[name] = load(name)
+
+    render_cache = read_render_cache()
+    pending = []
+    for output_name, grid in jobs:
+        grid_names = [name for row in grid for name in row]
+        for output_format in formats:
+            output_filename = output_name + '.' + output_format
+            digest = data_hash(grid_names, grid, data, output_format)
+            if force or render_cache.get(output_filename) != digest or not os.path.exists(output_filename):
+                pending.append((output_filename, grid, {name: data[name] for name in grid_names}, digest))
+
+    if workers == 1 or len(pending) <= 1:
+        for output_filename, grid, grid_data, _ in pending:
+            draw(output_filename, grid, grid_data)
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            list(executor.map(draw, *zip(*[(output_filename, grid, grid_data) for output_filename, grid, grid_data, _ in pending])))
+
+    # Re-read the cache so concurrent renders of other figures are kept
+    render_cache = read_render_cache()
+    render_cache.update({output_filename: digest for output_filename, _, _, digest in pending})
+    with open(render_cache_filename, 'w') as file:
+        json.dump(render_cache, file, indent=1, sort_keys=True)
+    return [output_filename for output_filename, _, _, _ in pending]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render every profile and run-length figure from the precomputed CSVs.')
+    parser.add_argument('names', nargs='*', help='figures to render (default: every figure whose CSV exists)')
+    parser.add_argument('--formats', nargs='+', default=['png'], choices=['png', 'pdf', 'svg'])
+    parser.add_argument('--no-composites', action='store_true', help='skip the multi-panel figures')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--force', action='store_true', help='redraw even if the data did not change')
+    args = parser.parse_args()
+
+    names = args.names or [name for name in figures if os.path.exists(name + '.csv')]
+    for output_filename in render(names, args.formats, not args.no_composites, workers=args.workers, force=args.force):
+        print(output_filename)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+from time_grid import run_columns
+import argparse
+import numpy as np
+import pandas as pd
+import ingest
+
+
+# Coverage index of a snapshot table, built once at load time: the first and last snapshot time and
+# the number of snapshots of every run. It has the columns of snapshot_store.runs, so the runs read
+# from the store can be used in its place.
+def coverage_index(snapshots_df: pd.DataFrame) -> pd.DataFrame:
+    columns = (['metric name'] if 'metric name' in snapshots_df.columns else []) + run_columns
+    coverage_df = snapshots_df.groupby(columns, observed=True)['snapshot time'].agg(['min', 'max', 'size']).reset_index()
+    return coverage_df.rename(columns={'min': 'first time', 'max': 'last time', 'size': 'snapshots'})
+
+
+# Number of runs every solver should have: one per instance and seed
+def expected_runs(coverage_df: pd.DataFrame) -> int:
+    return coverage_df['instance'].nunique() * coverage_df['seed'].nunique()
+
+
+# (solver, instance, seed) runs absent from the index, per metric when it has several
+def missing_runs(coverage_df: pd.DataFrame) -> pd.DataFrame:
+    if 'metric name' not in coverage_df.columns:
+        coverage_df = coverage_df.assign(**{'metric name': ''})
+    return ingest.missing_runs(coverage_df)
+
+
+# Times at which the fractions are defined: from the latest first snapshot on, when every run has
+# data, or from the earliest one with partial coverage. Without partial coverage a missing run leaves
+# no valid time at all, which raises a ValueError naming it.
+def valid_time_window(coverage_df: pd.DataFrame, partial_coverage: bool = False) -> tuple[float, float]:
+    end = coverage_df['last time'].max()
+    if partial_coverage:
+        return coverage_df['first time'].min(), end
+    missing_df = missing_runs(coverage_df)
+    if len(missing_df) > 0:
+        quoted = ', '.join(str(run) for run in missing_df[run_columns].head(ingest.max_reported).itertuples(index=False, name=None))
+        raise ValueError(f'{len(missing_df)} (solver, instance, seed) runs have no snapshot, e.g. {quoted}; use partial coverage to estimate the fractions over the runs with data')
+    return coverage_df['first time'].max(), end
+
+
+# Number of runs of every solver with data at every time, read off the sorted first snapshot times
+# instead of the aligned values
+def runs_with_data(coverage_df: pd.DataFrame, time_values: np.ndarray, solvers: list[str] | None = None) -> pd.DataFrame:
+    num_with_data = {}
+    for solver, first_time in coverage_df.groupby('solver', observed=True)['first time']:
+        num_with_data[solver] = np.searchsorted(np.sort(first_time.to_numpy()), time_values, side='right')
+    num_with_data_df = pd.DataFrame(num_with_data, index=time_values)
+    if solvers is not None:
+        num_with_data_df = num_with_data_df.reindex(columns=solvers, fill_value=0)
+    return num_with_data_df
+
+
+# Fraction of the runs meeting a target: over all expected runs, NaN where some of them have no data
+# yet, or with partial coverage over the runs that have data, NaN where none has
+def coverage_fraction(num_meeting: np.ndarray, num_with_data: np.ndarray, num_runs: int, partial_coverage: bool = False) -> np.ndarray:
+    if partial_coverage:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(num_with_data > 0, num_meeting / num_with_data, np.nan)
+    return np.where(num_with_data == num_runs, num_meeting / num_runs, np.nan)
+
+
+# Per solver (and metric): runs present and missing, the span of their first snapshot times and the
+# span of their last ones. Runs that stop early show up as an earliest last time before the others.
+def gap_report(coverage_df: pd.DataFrame) -> pd.DataFrame:
+    columns = (['metric name'] if 'metric name' in coverage_df.columns else []) + ['solver']
+    report_df = coverage_df.groupby(columns, observed=True).agg(**{
+        'runs': ('first time', 'size'),
+        'earliest first time': ('first time', 'min'),
+        'latest first time': ('first time', 'max'),
+        'earliest last time': ('last time', 'min'),
+        'latest last time': ('last time', 'max'),
+    })
+    missing_df = missing_runs(coverage_df)
+    if 'metric name' not in coverage_df.columns:
+        missing_df = missing_df.drop(columns='metric name')
+    report_df.insert(1, 'missing runs', missing_df.groupby(columns).size().reindex(report_df.index, fill_value=0).to_numpy())
+    return report_df.reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Coverage of the snapshot runs: valid time window and gaps per solver.')
+    parser.add_argument('--snapshots', default='metrics_snapshots.csv')
+    parser.add_argument('--partial-coverage', action='store_true', help='start the window at the first snapshot of any run')
+    args = parser.parse_args()
+
+    coverage_df = coverage_index(ingest.read(args.snapshots, require_complete=False))
+    for metric_name, metric_coverage_df in coverage_df.groupby('metric name', observed=True):
+        try:
+            start, end = valid_time_window(metric_coverage_df, args.partial_coverage)
+            print(f'{metric_name}: valid from {start:g} to {end:g}')
+        except ValueError as error:
+            print(f'{metric_name}: {error}')
+    print(gap_report(coverage_df).to_string(index=False))
+    missing_df = missing_runs(coverage_df)
+    if len(missing_df) > 0:
+        print(missing_df.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+from multiprocessing import Pool
+from registry import metrics, solver_codes, solver_order
+from run_coverage import coverage_fraction, coverage_index, expected_runs, runs_with_data, valid_time_window
+from time_grid import align_to_grid, log_time_grid
+import argparse
+import glob
+import os
+import zlib
+import numpy as np
+import pandas as pd
+import ingest
+
+# Performance profiles of the final values: metric name and whether the best value is the max or the min
+profiles = {key: (metric['name'], metric['direction']) for key, metric in metrics.items()}
+
+# Run-length curves of the snapshots: metric name, best value direction, whether the target applies
+# to the value itself or to its deviation from the best value of the instance, and the target
+run_lengths = {}
+for key, metric in metrics.items():
+    for variant, target in metric['targets'].items():
+        run_lengths[f'{key}_snapshots_{variant}'] = (metric['name'], metric['direction'], 'value', target)
+    run_lengths[f'{key}_snapshots'] = (metric['name'], metric['direction'], 'deviation', metric['target deviation'])
+
+
+# Shard of each row: a stable hash of its partition column (instance or problem), so that every
+# instance lives in exactly one shard and its best value, hence its ratios, are known locally
+def shard_of(df: pd.DataFrame, partition: str, num_shards: int) -> np.ndarray:
+    keys = df[partition].astype(str)
+    shard_of_key = {key: zlib.crc32(key.encode()) % num_shards for key in keys.unique()}
+    return keys.map(shard_of_key).to_numpy()
+
+
+def ratio_to_best(df: pd.DataFrame, best: str) -> tuple[pd.Series, np.ndarray]:
+    best_per_instance = df.groupby('instance')['metric value'].agg(best)
+    best_value = df['instance'].map(best_per_instance).to_numpy(dtype=float)
+    metric_value = df['metric value'].to_numpy(dtype=float)
+    return best_per_instance, best_value / metric_value if best == 'max' else metric_value / best_value
+
+
+# Partial aggregates of one shard: per-instance best values and per-solver sorted ratios for the
+# profiles, and per-solver hit and data counts on the shared time grid for the run-length curves
+def map_shard(metrics_df: pd.DataFrame, metrics_snapshots_df: pd.DataFrame | None, time_values: np.ndarray) -> dict:
+    partial = {'profiles': {}, 'run_lengths': {}}
+
+    for name, (metric_name, best) in profiles.items():
+        metric_df = metrics_df[metrics_df['metric name'] == metric_name]
+        best_per_instance, ratio = ratio_to_best(metric_df, best)
+        # One sort by (solver, ratio), then split at the solver boundaries
+        shard_solvers = solver_order(metric_df['solver'].unique())
+        solver_of_row = solver_codes(metric_df['solver'], shard_solvers)
+        order = np.lexsort((ratio, solver_of_row))
+        boundaries = np.searchsorted(solver_of_row[order], np.arange(1, len(shard_solvers)))
+        partial['profiles'][name] = {
+            'best per instance': best_per_instance,
+            'sorted ratios': dict(zip(shard_solvers, np.split(ratio[order], boundaries))),
+        }
+
+    if metrics_snapshots_df is None:
+        return partial
+    for name, (metric_name, best, kind, target) in run_lengths.items():
+        snapshots_df = metrics_snapshots_df[metrics_snapshots_df['metric name'] == metric_name]
+        if snapshots_df.empty:
+            continue
+        best_per_instance = None
+        if kind == 'deviation':
+            best_per_instance, ratio = ratio_to_best(snapshots_df, best)
+            snapshots_df = snapshots_df.assign(**{'metric value': ratio})
+            meets = lambda values: values <= target
+        elif best == 'max':
+            meets = lambda values: values >= target
+        else:
+            meets = lambda values: values <= target
+        runs_df, values = align_to_grid(snapshots_df, time_values)
+        shard_solvers = solver_order(runs_df['solver'].unique())
+        solver_of_run = solver_codes(runs_df['solver'], shard_solvers)
+        meeting = np.zeros((len(shard_solvers), len(time_values)), dtype=np.int64)
+        np.add.at(meeting, solver_of_run, meets(values))
+        coverage_df = coverage_index(snapshots_df)
+        with_data = runs_with_data(coverage_df, time_values, shard_solvers)
+        partial['run_lengths'][name] = {
+            'best per instance': best_per_instance,
+            'coverage': coverage_df,
+            'with data': {solver: with_data[solver].to_numpy() for solver in shard_solvers},
+            'meeting target': dict(zip(shard_solvers, meeting)),
+        }
+    return partial
+
+
+# Input files of one shard, written by partition_inputs
+def shard_inputs(shard: int, num_shards: int, shard_dir: str) -> tuple[str, str]:
+    prefix = os.path.join(shard_dir, f'input_{shard:04d}_of_{num_shards:04d}')
+    return prefix + '_metrics.csv', prefix + '_snapshots.csv'
+
+
+# Splits the inputs into one metrics and one snapshots file per shard, in a single pass over each, so
+# that every map step only parses the rows of its own shard. The metrics file is checked for missing
+# runs as a whole here. The snapshots are streamed in chunks; their missing runs are only known once
+# all shards are reduced, where the coverage of every run is combined.
+def partition_inputs(num_shards: int, partition: str, metrics_filename: str, metrics_snapshots_filename: str | None, shard_dir: str):
+    metrics_df = ingest.read(metrics_filename)
+    shard_of_row = shard_of(metrics_df, partition, num_shards)
+    for shard in range(num_shards):
+        metrics_df[shard_of_row == shard].to_csv(shard_inputs(shard, num_shards, shard_dir)[0], index=False)
+
+    snapshot_filenames = [shard_inputs(shard, num_shards, shard_dir)[1] for shard in range(num_shards)]
+    if metrics_snapshots_filename is None or not os.path.exists(metrics_snapshots_filename):
+        for filename in snapshot_filenames:
+            if os.path.exists(filename):
+                os.remove(filename)
+        return
+    # Write then rename so a map step never reads a partial file
+    files = [open(f'{filename}.{os.getpid()}', 'w', newline='') for filename in snapshot_filenames]
+    try:
+        for i, chunk in enumerate(ingest.iter_chunks(metrics_snapshots_filename, 1_000_000, require_complete=False)):
+            shard_of_row = shard_of(chunk, partition, num_shards)
+            for shard, file in enumerate(files):
+                chunk[shard_of_row == shard].to_csv(file, header=i == 0, index=False)
+    finally:
+        for file in files:
+            file.close()
+    for filename in snapshot_filenames:
+        os.replace(f'{filename}.{os.getpid()}', filename)
+
+
+def run_map(shard: int, num_shards: int, shard_dir: str, time_values: np.ndarray) -> str:
+    metrics_filename, metrics_snapshots_filename = shard_inputs(shard, num_shards, shard_dir)
+    if not os.path.exists(metrics_filename):
+        raise FileNotFoundError(f'{metrics_filename} not found, run the partition step with --num-shards {num_shards} first')
+    metrics_df = ingest.read(metrics_filename, require_complete=False)
+    metrics_snapshots_df = None
+    if os.path.exists(metrics_snapshots_filename):
+        metrics_snapshots_df = ingest.read(metrics_snapshots_filename, require_complete=False)
+    shard_filename = os.path.join(shard_dir, f'shard_{shard:04d}_of_{num_shards:04d}.pkl')
+    pd.to_pickle({'time values': time_values, **map_shard(metrics_df, metrics_snapshots_df, time_values)}, shard_filename)
+    return shard_filename
+
+
+# Combines the shard partials into the same profile and run-length CSVs the scripts write
+def reduce_shards(shard_filenames: list[str], output_dir: str, partial_coverage: bool = False):
+    partials = [pd.read_pickle(shard_filename) for shard_filename in shard_filenames]
+    time_values = partials[0]['time values']
+    if any(not np.array_equal(partial['time values'], time_values) for partial in partials):
+        raise ValueError('shards were computed on different time grids')
+
+    for name in profiles:
+        sorted_ratios: dict[str, list[np.ndarray]] = {}
+        for partial in partials:
+            for solver, ratios in partial['profiles'][name]['sorted ratios'].items():
+                sorted_ratios.setdefault(solver, []).append(ratios)
+        sorted_ratios = {solver: np.sort(np.concatenate(ratios)) for solver, ratios in sorted_ratios.items()}
+        rho_values = np.unique(np.concatenate(list(sorted_ratios.values())))
+        cumulative_distribution = {solver: np.searchsorted(ratios, rho_values, side='right') / len(ratios) for solver, ratios in sorted_ratios.items()}
+        cumulative_distribution_df = pd.DataFrame(cumulative_distribution, index=rho_values)
+        cumulative_distribution_df[solver_order(cumulative_distribution_df.columns)].to_csv(os.path.join(output_dir, name + '.csv'))
+        pd.concat([partial['profiles'][name]['best per instance'] for partial in partials]).sort_index().to_csv(os.path.join(output_dir, name + '_best_per_instance.csv'))
+
+    for name in run_lengths:
+        shard_partials = [partial['run_lengths'][name] for partial in partials if name in partial['run_lengths']]
+        if len(shard_partials) == 0:
+            continue
+        # Instances never span shards, so the shard coverages add up to the coverage of the whole file
+        coverage_df = pd.concat([partial['coverage'] for partial in shard_partials], ignore_index=True)
+        num_runs = expected_runs(coverage_df)
+        window_start, _ = valid_time_window(coverage_df, partial_coverage)
+        cumulative_distribution = {}
+        for solver in solver_order({solver for partial in shard_partials for solver in partial['with data']}):
+            with_data = sum(partial['with data'][solver] for partial in shard_partials if solver in partial['with data'])
+            meeting = sum(partial['meeting target'][solver] for partial in shard_partials if solver in partial['meeting target'])
+            cumulative_distribution[solver] = coverage_fraction(meeting, with_data, num_runs, partial_coverage)
+        cumulative_distribution_df = pd.DataFrame(cumulative_distribution, index=time_values)
+        cumulative_distribution_df[time_values >= window_start].to_csv(os.path.join(output_dir, name + '.csv'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sharded map/reduce computation of the performance profiles and run-length curves.')
+    parser.add_argument('step', choices=['partition', 'map', 'reduce', 'local'], help="'partition' the inputs into per-shard files, 'map' one shard, 'reduce' the shard files, or run all three 'local'ly with worker processes")
+    parser.add_argument('--shard', type=int, help='shard computed by a map step')
+    parser.add_argument('--num-shards', type=int, default=8)
+    parser.add_argument('--partition', choices=['instance', 'problem'], default='instance')
+    parser.add_argument('--metrics', default='metrics.csv')
+    parser.add_argument('--snapshots', default='metrics_snapshots.csv')
+    parser.add_argument('--shard-dir', default='shards')
+    parser.add_argument('--output-dir', default='.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    # Every shard must use the same time grid, so its bounds are fixed up front
+    parser.add_argument('--time-min', type=float, default=1.0)
+    parser.add_argument('--time-max', type=float, default=3600.0)
+    parser.add_argument('--num-times', type=int, default=200)
+    parser.add_argument('--partial-coverage', action='store_true', help='estimate the run-length fractions over the runs with data at each time')
+    args = parser.parse_args()
+
+    time_values = log_time_grid(pd.DataFrame({'snapshot time': []}), args.num_times, args.time_min, args.time_max)
+    os.makedirs(args.shard_dir, exist_ok=True)
+
+    if args.step == 'partition':
+        partition_inputs(args.num_shards, args.partition, args.metrics, args.snapshots, args.shard_dir)
+    elif args.step == 'map':
+        if args.shard is None:
+            parser.error('map needs --shard')
+        run_map(args.shard, args.num_shards, args.shard_dir, time_values)
+    elif args.step == 'reduce':
+        reduce_shards(sorted(glob.glob(os.path.join(args.shard_dir, f'shard_*_of_{args.num_shards:04d}.pkl'))), args.output_dir, args.partial_coverage)
+    else:
+        partition_inputs(args.num_shards, args.partition, args.metrics, args.snapshots, args.shard_dir)
+        with Pool(args.workers) as pool:
+            shard_filenames = pool.starmap(run_map, [(shard, args.num_shards, args.shard_dir, time_values) for shard in range(args.num_shards)])
+        reduce_shards(shard_filenames, args.output_dir, args.partial_coverage)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+from registry import solver_order
+from run_coverage import expected_runs, runs_with_data, valid_time_window
+from shards import profiles, run_lengths
+from time_grid import log_time_grid
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import ingest
+import snapshot_store
+
+
+# KLL quantile sketch. Items live in compactors of increasing level, an item at level h standing for
+# 2**h original values. A full compactor sorts itself and promotes every other item, from a random
+# offset, to the next level. Sketches of disjoint data merge by concatenating their levels, and ranks
+# are within roughly epsilon * n of the exact ones, with k about 2.5 / epsilon.
+class KLLSketch:
+
+    def __init__(self, k: int = 200, seed: int | None = None):
+        self.k = k
+        self.compactors: list[np.ndarray] = [np.empty(0)]
+        self.count = 0
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def for_error(cls, epsilon: float, seed: int | None = None) -> 'KLLSketch':
+        return cls(max(8, int(np.ceil(2.5 / epsilon))), seed)
+
+    def capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return max(2, int(np.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def compress(self):
+        level = 0
+        while level < len(self.compactors):
+            items = self.compactors[level]
+            if len(items) > self.capacity(level):
+                if level + 1 == len(self.compactors):
+                    self.compactors.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays at this level
+                kept, items = items[:len(items) % 2], items[len(items) % 2:]
+                promoted = items[self.rng.integers(2)::2]
+                self.compactors[level] = kept
+                self.compactors[level + 1] = np.concatenate([self.compactors[level + 1], promoted])
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self.compactors[0] = np.concatenate([self.compactors[0], values])
+        self.compress()
+
+    def merge(self, other: 'KLLSketch'):
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append(np.empty(0))
+        for level, items in enumerate(other.compactors):
+            self.compactors[level] = np.concatenate([self.compactors[level], items])
+        self.count += other.count
+        self.compress()
+
+    def weighted_items(self) -> tuple[np.ndarray, np.ndarray]:
+        items = np.concatenate(self.compactors)
+        weights = np.concatenate([np.full(len(compactor), 2.0 ** level) for level, compactor in enumerate(self.compactors)])
+        order = np.argsort(items, kind='stable')
+        return items[order], weights[order]
+
+    # Approximate fraction of the values <= x (or < x when not inclusive), for every x at once
+    def cdf(self, x, inclusive: bool = True) -> np.ndarray:
+        items, weights = self.weighted_items()
+        if len(items) == 0:
+            return np.full(np.shape(x), np.nan)
+        cumulative_weight = np.concatenate([[0.0], np.cumsum(weights)])
+        position = np.searchsorted(items, x, side='right' if inclusive else 'left')
+        return cumulative_weight[position] / cumulative_weight[-1]
+
+    def quantile(self, q) -> np.ndarray:
+        items, weights = self.weighted_items()
+        cumulative_weight = np.cumsum(weights)
+        return items[np.minimum(np.searchsorted(cumulative_weight, np.asarray(q) * cumulative_weight[-1], side='left'), len(items) - 1)]
+
+
+# Approximate performance profiles: per-solver sketches of the ratios to the best value of the
+# instance, fed chunk by chunk. The best values come from a first streaming pass over the file.
+def approximate_profiles(metrics_filename: str, epsilon: float, chunksize: int) -> dict[str, pd.DataFrame]:
+    best_per_instance: dict[str, pd.Series] = {}
+    for chunk in ingest.iter_chunks(metrics_filename, chunksize, columns=['instance', 'metric name', 'metric value']):
+        for name, (metric_name, best) in profiles.items():
+            chunk_best = chunk[chunk['metric name'] == metric_name].groupby('instance')['metric value'].agg(best)
+            best_per_instance[name] = pd.concat([best_per_instance.get(name, pd.Series(dtype=float)), chunk_best]).groupby(level=0).agg(best)
+
+    sketches: dict[str, dict[str, KLLSketch]] = {name: {} for name in profiles}
+    for chunk in ingest.iter_chunks(metrics_filename, chunksize, columns=['instance', 'solver', 'metric name', 'metric value']):
+        for name, (metric_name, best) in profiles.items():
+            metric_df = chunk[chunk['metric name'] == metric_name]
+            best_value = metric_df['instance'].map(best_per_instance[name]).to_numpy(dtype=float)
+            metric_value = metric_df['metric value'].to_numpy(dtype=float)
+            ratio = best_value / metric_value if best == 'max' else metric_value / best_value
+            for solver, solver_ratio in pd.Series(ratio).groupby(metric_df['solver'].to_numpy()):
+                sketches[name].setdefault(solver, KLLSketch.for_error(epsilon)).update(solver_ratio.to_numpy())
+
+    cumulative_distributions = {}
+    for name, solver_sketches in sketches.items():
+        if len(solver_sketches) == 0:
+            continue
+        # The retained items of all sketches are the rho values at which the profiles can change
+        rho_values = np.unique(np.concatenate([sketch.weighted_items()[0] for sketch in solver_sketches.values()]))
+        cumulative_distribution = {solver: sketch.cdf(rho_values) for solver, sketch in solver_sketches.items()}
+        cumulative_distribution_df = pd.DataFrame(cumulative_distribution, index=rho_values)
+        cumulative_distributions[name] = cumulative_distribution_df[solver_order(cumulative_distribution_df.columns)]
+    return cumulative_distributions
+
+
+# Approximate run-length curves: per-(solver, time) sketches of the runs' as-of values streamed from
+# the snapshot store, so any target can be evaluated afterwards without another pass over the data.
+# The runs table of the store is the coverage index: it gives the valid window and the runs with data.
+def approximate_run_lengths(con, epsilon: float, num_times: int, partial_coverage: bool = False) -> dict[str, pd.DataFrame]:
+    cumulative_distributions = {}
+    for metric_name in dict.fromkeys(metric_name for metric_name, _, _, _ in run_lengths.values()):
+        runs_df = snapshot_store.runs(con, metric_name)
+        if runs_df.empty:
+            continue
+        time_values = log_time_grid(pd.DataFrame({'snapshot time': []}), num_times, runs_df['first time'].min(), runs_df['last time'].max())
+        window_start, _ = valid_time_window(runs_df, partial_coverage)
+        time_values = time_values[time_values >= window_start]
+        num_with_data = runs_with_data(runs_df, time_values)
+        deviation_targets = {name: (best, target) for name, (name_metric, best, kind, target) in run_lengths.items() if name_metric == metric_name and kind == 'deviation'}
+        best_per_instance = {best: snapshot_store.best_per_instance(con, metric_name, best) for best, _ in deviation_targets.values()}
+
+        value_sketches: dict[tuple[str, int], KLLSketch] = {}
+        ratio_sketches: dict[tuple[str, str, int], KLLSketch] = {}
+        for as_of_df in snapshot_store.iter_as_of(con, metric_name, time_values):
+            time_index = np.searchsorted(time_values, as_of_df['time'].to_numpy())
+            for (solver, time), group in as_of_df.groupby([as_of_df['solver'], time_index])['metric value']:
+                value_sketches.setdefault((solver, time), KLLSketch.for_error(epsilon)).update(group.to_numpy())
+            for best, best_values in best_per_instance.items():
+                best_value = as_of_df['instance'].map(best_values).to_numpy(dtype=float)
+                metric_value = as_of_df['metric value'].to_numpy(dtype=float)
+                ratio = pd.Series(best_value / metric_value if best == 'max' else metric_value / best_value)
+                for (solver, time), group in ratio.groupby([as_of_df['solver'].to_numpy(), time_index]):
+                    ratio_sketches.setdefault((best, solver, time), KLLSketch.for_error(epsilon)).update(group.to_numpy())
+
+        num_runs = expected_runs(runs_df)
+        for name, (name_metric, best, kind, target) in run_lengths.items():
+            if name_metric != metric_name:
+                continue
+            cumulative_distribution = {}
+            for solver in solver_order(runs_df['solver'].unique()):
+                # The sketches only hold the runs with data, so their fractions are over those runs
+                solver_with_data = num_with_data[solver].to_numpy()
+                defined = solver_with_data > 0 if partial_coverage else solver_with_data == num_runs
+                fraction = np.full(len(time_values), np.nan)
+                for time in np.flatnonzero(defined):
+                    if kind == 'deviation':
+                        fraction[time] = ratio_sketches[(best, solver, time)].cdf(target)
+                    elif best == 'max':
+                        fraction[time] = 1.0 - value_sketches[(solver, time)].cdf(target, inclusive=False)
+                    else:
+                        fraction[time] = value_sketches[(solver, time)].cdf(target)
+                cumulative_distribution[solver] = fraction
+            cumulative_distributions[name] = pd.DataFrame(cumulative_distribution, index=time_values)
+    return cumulative_distributions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Approximate performance profiles and run-length curves from mergeable quantile sketches.')
+    parser.add_argument('--metrics', default='metrics.csv')
+    parser.add_argument('--snapshots-db', default='metrics_snapshots.sqlite', help='snapshot store built by snapshot_store.py')
+    parser.add_argument('--epsilon', type=float, default=0.005, help='rank error bound of the sketches, as a fraction of the number of values')
+    parser.add_argument('--chunksize', type=int, default=1_000_000)
+    parser.add_argument('--num-times', type=int, default=200)
+    parser.add_argument('--partial-coverage', action='store_true', help='estimate the run-length fractions over the runs with data at each time')
+    args = parser.parse_args()
+
+    for name, cumulative_distribution_df in approximate_profiles(args.metrics, args.epsilon, args.chunksize).items():
+        cumulative_distribution_df.to_csv(name + '_approximate.csv')
+    if os.path.exists(args.snapshots_db):
+        con = snapshot_store.connect(args.snapshots_db)
+        for name, cumulative_distribution_df in approximate_run_lengths(con, args.epsilon, args.num_times, args.partial_coverage).items():
+            cumulative_distribution_df.to_csv(name + '_approximate.csv')
+        con.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+import argparse
+import sqlite3
+import numpy as np
+import pandas as pd
+import ingest
+
+# On-disk store of metrics_snapshots.csv. Names are dictionary-encoded and the snapshots table is
+# clustered on (metric, solver, instance, seed, snapshot time), so every as-of lookup is one index seek
+schema = '''
+CREATE TABLE IF NOT EXISTS metrics (metric_id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS solvers (solver_id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS instances (
+    instance_id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    problem TEXT,
+    number_of_objectives INTEGER,
+    chromosome_size INTEGER
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    metric_id INTEGER NOT NULL,
+    solver_id INTEGER NOT NULL,
+    instance_id INTEGER NOT NULL,
+    seed INTEGER NOT NULL,
+    snapshot_time REAL NOT NULL,
+    metric_value REAL NOT NULL,
+    PRIMARY KEY (metric_id, solver_id, instance_id, seed, snapshot_time)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS snapshots_by_time ON snapshots (metric_id, snapshot_time);
+CREATE TABLE IF NOT EXISTS runs (
+    metric_id INTEGER NOT NULL,
+    solver_id INTEGER NOT NULL,
+    instance_id INTEGER NOT NULL,
+    seed INTEGER NOT NULL,
+    first_time REAL NOT NULL,
+    last_time REAL NOT NULL,
+    PRIMARY KEY (metric_id, solver_id, instance_id, seed)
+) WITHOUT ROWID;
+'''
+
+
+def connect(db_filename: str) -> sqlite3.Connection:
+    con = sqlite3.connect(db_filename)
+    con.execute('PRAGMA journal_mode = WAL')
+    con.execute('PRAGMA synchronous = NORMAL')
+    con.executescript(schema)
+    return con
+
+
+def ids_of(con: sqlite3.Connection, table: str, id_column: str, names) -> dict[str, int]:
+    con.executemany(f'INSERT OR IGNORE INTO {table} (name) VALUES (?)', [(name,) for name in names])
+    return dict(con.execute(f'SELECT name, {id_column} FROM {table}').fetchall())
+
+
+# Imports a snapshot CSV chunk by chunk, so memory stays bounded by the chunk size. Runs may be
+# missing, as in a campaign that is still running. Every chunk is committed once it is checked, and
+# the runs table is rebuilt from the committed snapshots even if a later chunk fails its checks.
+def import_csv(con: sqlite3.Connection, csv_filename: str, chunksize: int = 1_000_000):
+    columns = ['problem', 'instance', 'number of objectives', 'chromosome size', 'solver', 'seed', 'metric name', 'metric value', 'snapshot time']
+    try:
+        for chunk in ingest.iter_chunks(csv_filename, chunksize, columns, require_complete=False):
+            metric_ids = ids_of(con, 'metrics', 'metric_id', chunk['metric name'].unique())
+            solver_ids = ids_of(con, 'solvers', 'solver_id', chunk['solver'].unique())
+            instances_df = chunk[['instance', 'problem', 'number of objectives', 'chromosome size']].drop_duplicates('instance')
+            con.executemany('INSERT OR IGNORE INTO instances (name, problem, number_of_objectives, chromosome_size) VALUES (?, ?, ?, ?)', instances_df.itertuples(index=False, name=None))
+            instance_ids = dict(con.execute('SELECT name, instance_id FROM instances').fetchall())
+            rows = pd.DataFrame({
+                'metric_id': chunk['metric name'].map(metric_ids).astype(np.int64),
+                'solver_id': chunk['solver'].map(solver_ids).astype(np.int64),
+                'instance_id': chunk['instance'].map(instance_ids).astype(np.int64),
+                'seed': chunk['seed'],
+                'snapshot_time': chunk['snapshot time'].astype(float),
+                'metric_value': chunk['metric value'].astype(float),
+            })
+            con.executemany('INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?)', rows.itertuples(index=False, name=None))
+            con.commit()
+    finally:
+        # Drop the rows of a chunk that failed half way, then index the first and last snapshot time of every run
+        con.rollback()
+        con.execute('DELETE FROM runs')
+        con.execute('''
+            INSERT INTO runs
+            SELECT metric_id, solver_id, instance_id, seed, MIN(snapshot_time), MAX(snapshot_time)
+            FROM snapshots GROUP BY metric_id, solver_id, instance_id, seed
+        ''')
+        con.commit()
+
+
+def run_filter(metric_name: str, solver: str | None, instance: str | None) -> tuple[str, list]:
+    conditions, parameters = ['m.name = ?'], [metric_name]
+    if solver is not None:
+        conditions.append('so.name = ?')
+        parameters.append(solver)
+    if instance is not None:
+        conditions.append('i.name = ?')
+        parameters.append(instance)
+    return ' AND '.join(conditions), parameters
+
+
+# Runs of a metric with their first and last snapshot times
+def runs(con: sqlite3.Connection, metric_name: str, solver: str | None = None, instance: str | None = None) -> pd.DataFrame:
+    where, parameters = run_filter(metric_name, solver, instance)
+    return pd.read_sql_query(f'''
+        SELECT so.name AS solver, i.name AS instance, r.seed AS seed, r.first_time AS "first time", r.last_time AS "last time"
+        FROM runs r
+        JOIN metrics m ON m.metric_id = r.metric_id
+        JOIN solvers so ON so.solver_id = r.solver_id
+        JOIN instances i ON i.instance_id = r.instance_id
+        WHERE {where}
+        ORDER BY so.name, i.name, r.seed
+    ''', con, params=parameters)
+
+
+# As-of value of every run at every given time: the latest snapshot at or before it (NaN before the
+# first snapshot). Results are streamed in chunks of rows so memory does not grow with the store.
+def iter_as_of(con: sqlite3.Connection, metric_name: str, time_values, solver: str | None = None, instance: str | None = None, chunksize: int = 100_000):
+    con.execute('CREATE TEMP TABLE IF NOT EXISTS query_times (time REAL PRIMARY KEY)')
+    con.execute('DELETE FROM query_times')
+    con.executemany('INSERT OR IGNORE INTO query_times VALUES (?)', [(float(time),) for time in time_values])
+    where, parameters = run_filter(metric_name, solver, instance)
+    cursor = con.execute(f'''
+        SELECT so.name, i.name, r.seed, t.time,
+            (SELECT s.metric_value FROM snapshots s
+             WHERE s.metric_id = r.metric_id AND s.solver_id = r.solver_id AND s.instance_id = r.instance_id
+               AND s.seed = r.seed AND s.snapshot_time <= t.time
+             ORDER BY s.snapshot_time DESC LIMIT 1)
+        FROM runs r
+        JOIN metrics m ON m.metric_id = r.metric_id
+        JOIN solvers so ON so.solver_id = r.solver_id
+        JOIN instances i ON i.instance_id = r.instance_id
+        CROSS JOIN query_times t
+        WHERE {where}
+        ORDER BY so.name, i.name, r.seed, t.time
+    ''', parameters)
+    while True:
+        rows = cursor.fetchmany(chunksize)
+        if len(rows) == 0:
+            break
+        as_of_df = pd.DataFrame(rows, columns=['solver', 'instance', 'seed', 'time', 'metric value'])
+        as_of_df['metric value'] = as_of_df['metric value'].astype(float)
+        yield as_of_df
+
+
+# Empty when the store has no run of the metric, solver or instance, like runs and final_values
+def as_of(con: sqlite3.Connection, metric_name: str, time_values, solver: str | None = None, instance: str | None = None) -> pd.DataFrame:
+    chunks = list(iter_as_of(con, metric_name, time_values, solver, instance))
+    if len(chunks) == 0:
+        return pd.DataFrame(columns=['solver', 'instance', 'seed', 'time', 'metric value']).astype({'seed': np.int64, 'time': float, 'metric value': float})
+    return pd.concat(chunks, ignore_index=True)
+
+
+# Same (run x time) layout as time_grid.align_to_grid with step interpolation, read from the store
+def aligned(con: sqlite3.Connection, metric_name: str, time_values, solver: str | None = None, instance: str | None = None) -> tuple[pd.DataFrame, np.ndarray]:
+    time_values = np.unique(np.asarray(time_values, dtype=float))
+    values = as_of(con, metric_name, time_values, solver, instance)
+    runs_df = values[['solver', 'instance', 'seed']].iloc[::max(len(time_values), 1)].reset_index(drop=True)
+    return runs_df, values['metric value'].to_numpy().reshape(len(runs_df), len(time_values))
+
+
+# Last snapshot value of every run
+def final_values(con: sqlite3.Connection, metric_name: str, solver: str | None = None, instance: str | None = None) -> pd.DataFrame:
+    where, parameters = run_filter(metric_name, solver, instance)
+    return pd.read_sql_query(f'''
+        SELECT so.name AS solver, i.name AS instance, r.seed AS seed, s.snapshot_time AS "snapshot time", s.metric_value AS "metric value"
+        FROM runs r
+        JOIN metrics m ON m.metric_id = r.metric_id
+        JOIN solvers so ON so.solver_id = r.solver_id
+        JOIN instances i ON i.instance_id = r.instance_id
+        JOIN snapshots s ON s.metric_id = r.metric_id AND s.solver_id = r.solver_id AND s.instance_id = r.instance_id
+            AND s.seed = r.seed AND s.snapshot_time = r.last_time
+        WHERE {where}
+        ORDER BY so.name, i.name, r.seed
+    ''', con, params=parameters)
+
+
+# Best (max or min) snapshot value of the metric on each instance
+def best_per_instance(con: sqlite3.Connection, metric_name: str, direction: str) -> pd.Series:
+    if direction not in ('max', 'min'):
+        raise ValueError(f"unknown direction '{direction}', expected 'max' or 'min'")
+    best_df = pd.read_sql_query(f'''
+        SELECT i.name AS instance, {direction.upper()}(s.metric_value) AS "metric value"
+        FROM snapshots s
+        JOIN metrics m ON m.metric_id = s.metric_id
+        JOIN instances i ON i.instance_id = s.instance_id
+        WHERE m.name = ?
+        GROUP BY i.name
+        ORDER BY i.name
+    ''', con, params=[metric_name])
+    return best_df.set_index('instance')['metric value']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Indexed on-disk store of the snapshot metrics.')
+    parser.add_argument('--db', default='metrics_snapshots.sqlite')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help='import a snapshot CSV into the store')
+    import_parser.add_argument('csv', nargs='?', default='metrics_snapshots.csv')
+    import_parser.add_argument('--chunksize', type=int, default=1_000_000)
+    as_of_parser = subparsers.add_parser('as-of', help='write the as-of value of every run at the given times')
+    as_of_parser.add_argument('--metric', required=True)
+    as_of_parser.add_argument('--times', type=float, nargs='+', required=True)
+    as_of_parser.add_argument('--solver')
+    as_of_parser.add_argument('--instance')
+    as_of_parser.add_argument('--output', default='as_of.csv')
+    args = parser.parse_args()
+
+    con = connect(args.db)
+    if args.command == 'import':
+        import_csv(con, args.csv, args.chunksize)
+    else:
+        header = True
+        for as_of_df in iter_as_of(con, args.metric, args.times, args.solver, args.instance):
+            as_of_df.to_csv(args.output, mode='w' if header else 'a', header=header, index=False)
+            header = False
+    con.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+run_columns = ['solver', 'instance', 'seed']
+
+
+# Every snapshot time of every run, the finest grid the data supports
+def union_time_grid(snapshots_df: pd.DataFrame) -> np.ndarray:
+    return np.unique(snapshots_df['snapshot time'].to_numpy(dtype=float))
+
+
+# num_times log-spaced times between the earliest and the latest snapshot, unless bounds are given
+def log_time_grid(snapshots_df: pd.DataFrame, num_times: int, time_min: float | None = None, time_max: float | None = None) -> np.ndarray:
+    snapshot_time = snapshots_df['snapshot time'].to_numpy(dtype=float)
+    if time_min is None:
+        time_min = snapshot_time[snapshot_time > 0].min()
+    if time_max is None:
+        time_max = snapshot_time.max()
+    return np.geomspace(time_min, time_max, num_times)
+
+
+# Common time grid of the snapshot analyses: 'union' of all snapshot times, 'log' spaced, or 'given' time values
+def time_grid(snapshots_df: pd.DataFrame, kind: str = 'log', num_times: int = 200, time_values=None) -> np.ndarray:
+    if kind == 'union':
+        return union_time_grid(snapshots_df)
+    if kind == 'log':
+        return log_time_grid(snapshots_df, num_times)
+    if kind == 'given':
+        if time_values is None:
+            raise ValueError("a 'given' time grid needs time_values")
+        return np.unique(np.asarray(time_values, dtype=float))
+    raise ValueError(f"unknown time grid kind '{kind}', expected 'union', 'log' or 'given'")
+
+
+# Aligns every (solver, instance, seed) run on the time grid.
+# With 'step' each grid time takes the latest snapshot at or before it, as the original scripts did;
+# with 'linear' it interpolates between the snapshots around it. Grid times before a run's first
+# snapshot are NaN and grid times after its last snapshot keep the last value.
+# Runs are identified by the given columns, solver, instance and seed by default, so several metrics
+# can be aligned at once by adding 'metric name'.
+# Returns the runs, sorted by their columns, and a (run x time) array of values.
+def align_to_grid(snapshots_df: pd.DataFrame, time_values: np.ndarray, method: str = 'step', value_column: str = 'metric value', dtype=np.float64, columns: list[str] = run_columns) -> tuple[pd.DataFrame, np.ndarray]:
+    if method not in ('step', 'linear'):
+        raise ValueError(f"unknown interpolation method '{method}', expected 'step' or 'linear'")
+    time_values = np.asarray(time_values, dtype=float)
+    run = snapshots_df.groupby(columns, sort=True, observed=True).ngroup().to_numpy()
+    runs_df = snapshots_df[columns].drop_duplicates().sort_values(columns).reset_index(drop=True)
+    snapshot_time = snapshots_df['snapshot time'].to_numpy(dtype=float)
+    metric_value = snapshots_df[value_column].to_numpy(dtype=float)
+
+    # Sort once by (run, time) and encode both as a single increasing integer key
+    order = np.lexsort((snapshot_time, run))
+    run, snapshot_time, metric_value = run[order], snapshot_time[order], metric_value[order]
+    levels = np.unique(np.concatenate([snapshot_time, time_values]))
+    snapshot_key = run.astype(np.int64) * len(levels) + np.searchsorted(levels, snapshot_time)
+    num_runs = len(runs_df)
+    grid_key = np.arange(num_runs, dtype=np.int64)[:, None] * len(levels) + np.searchsorted(levels, time_values)[None, :]
+
+    # Latest snapshot of the same run at or before each grid time
+    before = np.searchsorted(snapshot_key, grid_key, side='right') - 1
+    clipped_before = np.maximum(before, 0)
+    has_before = (before >= 0) & (run[clipped_before] == np.arange(num_runs)[:, None])
+    values = np.where(has_before, metric_value[clipped_before], np.nan)
+
+    if method == 'linear':
+        # Earliest snapshot of the same run after each grid time
+        after = np.minimum(before + 1, len(run) - 1)
+        has_after = has_before & (before + 1 < len(run)) & (run[after] == np.arange(num_runs)[:, None])
+        time_before, time_after = snapshot_time[clipped_before], snapshot_time[after]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weight = np.where(has_after, (time_values[None, :] - time_before) / (time_after - time_before), 0.0)
+        values = np.where(has_after, values + weight * (metric_value[after] - values), values)
+
+    return runs_df, values.astype(dtype, copy=False)
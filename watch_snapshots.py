@@ -0,0 +1,257 @@
+from registry import metrics, solver_order
+from render import plot_cumulative_distribution, time_figure
+import argparse
+import glob
+import io
+import os
+import time
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+# Run-length targets followed live, the same ones used by the *_snapshots.py scripts
+targets = {
+    key + '_snapshots_' + variant: (metric['name'], '>=' if metric['direction'] == 'max' else '<=', target)
+    for key, metric in metrics.items() for variant, target in metric['targets'].items()
+}
+
+# Suffix of the files the watcher writes
+default_suffix = '_live'
+
+
+class SnapshotTail:
+    # Follows one or more growing snapshot files and returns only the complete rows appended since the last read.
+    # Files ending with the excluded suffix (the watcher's own outputs) are never read.
+
+    # Bytes before the offset compared on every read to tell an appended file from a rewritten one
+    mark_size = 256
+
+    def __init__(self, pattern: str, exclude_suffix: str | None = None):
+        self.pattern = pattern
+        self.exclude_suffix = exclude_suffix
+        self.offsets: dict[str, int] = {}
+        self.headers: dict[str, str] = {}
+        self.marks: dict[str, tuple[int, bytes]] = {}
+
+    def paths(self) -> list[str]:
+        paths = sorted(glob.glob(self.pattern))
+        if self.exclude_suffix:
+            paths = [path for path in paths if not os.path.splitext(path)[0].endswith(self.exclude_suffix)]
+        return paths
+
+    def read_new_rows(self) -> pd.DataFrame:
+        frames = []
+        for path in self.paths():
+            offset = self.offsets.get(path, 0)
+            with open(path, 'rb') as file:
+                if offset > 0:
+                    # The file was truncated, replaced or rewritten when the bytes read last no longer
+                    # end at the offset: start over from its header
+                    inode, mark = self.marks[path]
+                    file.seek(max(offset - len(mark), 0))
+                    if os.fstat(file.fileno()).st_ino != inode or file.read(len(mark)) != mark:
+                        self.offsets[path] = offset = 0
+                        self.headers.pop(path, None)
+                file.seek(offset)
+                chunk = file.read()
+                inode = os.fstat(file.fileno()).st_ino
+            # Leave a partially written last line for the next read
+            end = chunk.rfind(b'\n') + 1
+            if end == 0:
+                continue
+            self.offsets[path] = offset + end
+            previous_mark = self.marks[path][1] if offset > 0 else b''
+            self.marks[path] = (inode, (previous_mark + chunk[:end])[-self.mark_size:])
+            text = chunk[:end].decode()
+            if path not in self.headers:
+                header, _, text = text.partition('\n')
+                self.headers[path] = header + '\n'
+            if text:
+                frames.append(pd.read_csv(io.StringIO(self.headers[path] + text)))
+        if len(frames) == 0:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+
+class OnlineRunLengthECDF:
+    # Keeps the run-length ECDF of one (metric, target) pair on a fixed time grid.
+    # Each run contributes to a grid time the status of its latest snapshot at or before it,
+    # so a new snapshot settles the grid times between the previous snapshot and itself.
+    # Settled counts are additive and kept as difference arrays over the time grid.
+
+    def __init__(self, metric_name: str, direction: str, target_value: float, time_values: np.ndarray):
+        self.metric_name = metric_name
+        self.direction = direction
+        self.target_value = target_value
+        self.time_values = np.asarray(time_values, dtype=float)
+        self.solvers: list[str] = []
+        self.run_index: dict[tuple[str, str, int], int] = {}
+        self.run_solver = np.empty(0, dtype=int)
+        self.last_time = np.empty(0)
+        self.last_value = np.empty(0)
+        self.settled_total = np.zeros((0, len(self.time_values) + 1), dtype=np.int64)
+        self.settled_meeting = np.zeros((0, len(self.time_values) + 1), dtype=np.int64)
+        self.instances: set[str] = set()
+        self.seeds: set[int] = set()
+        self.now = -np.inf
+
+    def meets_target(self, values: np.ndarray) -> np.ndarray:
+        if self.direction == '>=':
+            return values >= self.target_value
+        return values <= self.target_value
+
+    def _add_runs(self, keys: list[tuple[str, str, int]]):
+        new_keys = [key for key in dict.fromkeys(keys) if key not in self.run_index]
+        for solver in dict.fromkeys(key[0] for key in new_keys):
+            if solver not in self.solvers:
+                self.solvers.append(solver)
+                self.settled_total = np.vstack([self.settled_total, np.zeros((1, self.settled_total.shape[1]), dtype=np.int64)])
+                self.settled_meeting = np.vstack([self.settled_meeting, np.zeros((1, self.settled_meeting.shape[1]), dtype=np.int64)])
+        for key in new_keys:
+            self.run_index[key] = len(self.run_index)
+            self.instances.add(key[1])
+            self.seeds.add(key[2])
+        self.run_solver = np.concatenate([self.run_solver, [self.solvers.index(key[0]) for key in new_keys]]).astype(int)
+        self.last_time = np.concatenate([self.last_time, np.full(len(new_keys), np.nan)])
+        self.last_value = np.concatenate([self.last_value, np.full(len(new_keys), np.nan)])
+
+    # Grid times lo to hi - 1 of each run take the given value for good
+    def _settle(self, run: np.ndarray, lo: np.ndarray, hi: np.ndarray, value: np.ndarray):
+        solver_of_run = self.run_solver[run]
+        meeting = self.meets_target(value).astype(np.int64)
+        np.add.at(self.settled_total, (solver_of_run, lo), 1)
+        np.add.at(self.settled_total, (solver_of_run, hi), -1)
+        np.add.at(self.settled_meeting, (solver_of_run, lo), meeting)
+        np.add.at(self.settled_meeting, (solver_of_run, hi), -meeting)
+
+    def update(self, rows: pd.DataFrame):
+        rows = rows[rows['metric name'] == self.metric_name]
+        if rows.empty:
+            return
+        keys = list(zip(rows['solver'], rows['instance'], rows['seed']))
+        self._add_runs(keys)
+        run = np.array([self.run_index[key] for key in keys], dtype=int)
+        snapshot_time = rows['snapshot time'].to_numpy(dtype=float)
+        metric_value = rows['metric value'].to_numpy(dtype=float)
+
+        # Snapshots at or before the latest known one of their run are ignored: they were seen already,
+        # as when a replaced file is read again from its start, or arrived out of order
+        latest_before = np.where(np.isnan(self.last_time[run]), -np.inf, self.last_time[run])
+        new = snapshot_time > latest_before
+        run, snapshot_time, metric_value = run[new], snapshot_time[new], metric_value[new]
+        if len(run) == 0:
+            return
+
+        # Order the batch by run and time, drop repeated snapshots, then chain each snapshot to the one before it
+        order = np.lexsort((snapshot_time, run))
+        run, snapshot_time, metric_value = run[order], snapshot_time[order], metric_value[order]
+        repeated = np.zeros(len(run), dtype=bool)
+        repeated[1:] = (run[1:] == run[:-1]) & (snapshot_time[1:] == snapshot_time[:-1])
+        run, snapshot_time, metric_value = run[~repeated], snapshot_time[~repeated], metric_value[~repeated]
+        first_of_run = np.ones(len(run), dtype=bool)
+        first_of_run[1:] = run[1:] != run[:-1]
+        previous_time = np.where(first_of_run, self.last_time[run], np.roll(snapshot_time, 1))
+        previous_value = np.where(first_of_run, self.last_value[run], np.roll(metric_value, 1))
+        has_previous = ~np.isnan(previous_time)
+
+        # Settle the grid times in [previous snapshot time, snapshot time) with the previous status
+        lo = np.searchsorted(self.time_values, previous_time[has_previous], side='left')
+        hi = np.searchsorted(self.time_values, snapshot_time[has_previous], side='left')
+        self._settle(run[has_previous], lo, hi, previous_value[has_previous])
+
+        # Keep the last snapshot of each run in the batch as its latest value
+        last_of_run = np.ones(len(run), dtype=bool)
+        last_of_run[:-1] = run[:-1] != run[1:]
+        self.last_time[run[last_of_run]] = snapshot_time[last_of_run]
+        self.last_value[run[last_of_run]] = metric_value[last_of_run]
+        self.now = max(self.now, snapshot_time.max())
+
+    def latest_values(self) -> pd.DataFrame:
+        keys = list(self.run_index.keys())
+        return pd.DataFrame({
+            'solver': [key[0] for key in keys],
+            'instance': [key[1] for key in keys],
+            'seed': [key[2] for key in keys],
+            'metric name': self.metric_name,
+            'snapshot time': self.last_time,
+            'metric value': self.last_value,
+        })
+
+    def cumulative_distribution(self) -> pd.DataFrame:
+        # Each run's latest snapshot still holds for every grid time after it
+        pending_total = np.zeros_like(self.settled_total)
+        pending_meeting = np.zeros_like(self.settled_meeting)
+        known = ~np.isnan(self.last_time)
+        lo = np.searchsorted(self.time_values, self.last_time[known], side='left')
+        np.add.at(pending_total, (self.run_solver[known], lo), 1)
+        np.add.at(pending_meeting, (self.run_solver[known], lo), self.meets_target(self.last_value[known]).astype(np.int64))
+        total = np.cumsum(self.settled_total + pending_total, axis=1)[:, :-1]
+        meeting = np.cumsum(self.settled_meeting + pending_meeting, axis=1)[:, :-1]
+
+        # A grid time only counts once every (instance, seed) run of the solver has reached it
+        num_runs = len(self.instances) * len(self.seeds)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fraction = np.where(total == num_runs, meeting / np.maximum(total, 1), np.nan)
+        cumulative_distribution_df = pd.DataFrame(fraction.T, index=self.time_values, columns=self.solvers)
+        cumulative_distribution_df = cumulative_distribution_df[solver_order(self.solvers)]
+
+        # Drop the grid times no run has reached yet and the leading ones without full coverage
+        cumulative_distribution_df = cumulative_distribution_df[cumulative_distribution_df.index <= self.now]
+        complete = cumulative_distribution_df.notna().all(axis=1).to_numpy()
+        if not complete.any():
+            return cumulative_distribution_df.iloc[0:0]
+        return cumulative_distribution_df.iloc[np.argmax(complete):]
+
+
+def refresh(ecdfs: dict[str, OnlineRunLengthECDF], suffix: str):
+    latest_values: dict[str, pd.DataFrame] = {}
+    for name, ecdf in ecdfs.items():
+        cumulative_distribution_df = ecdf.cumulative_distribution()
+        cumulative_distribution_df.to_csv(name + suffix + '.csv')
+        if not cumulative_distribution_df.empty:
+            fig, ax = plt.subplots()
+            plot_cumulative_distribution(ax, cumulative_distribution_df, time_figure)
+            fig.tight_layout()
+            fig.savefig(name + suffix + '.png')
+            plt.close(fig)
+        latest_values.setdefault(ecdf.metric_name, ecdf.latest_values())
+    # Outside the default snapshot pattern, so the watcher never reads its own output back
+    pd.concat(latest_values.values(), ignore_index=True).to_csv('latest_values' + suffix + '.csv', index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Follow growing snapshot files and keep the run-length ECDFs up to date.')
+    parser.add_argument('--snapshots', default='metrics_snapshots*.csv', help='file or glob pattern of the snapshot files to follow')
+    parser.add_argument('--time-min', type=float, default=1.0)
+    parser.add_argument('--time-max', type=float, default=3600.0)
+    parser.add_argument('--num-times', type=int, default=200, help='number of log-spaced grid times')
+    parser.add_argument('--poll', type=float, default=2.0, help='seconds between reads of the snapshot files')
+    parser.add_argument('--refresh', type=float, default=60.0, help='seconds between rewrites of the CSVs and plots')
+    parser.add_argument('--suffix', default=default_suffix, help='suffix of the written CSVs and plots, whose files are never followed')
+    parser.add_argument('--once', action='store_true', help='process the current contents once and exit')
+    args = parser.parse_args()
+
+    time_values = np.geomspace(args.time_min, args.time_max, args.num_times)
+    ecdfs = {name: OnlineRunLengthECDF(metric_name, direction, target_value, time_values) for name, (metric_name, direction, target_value) in targets.items()}
+    tail = SnapshotTail(args.snapshots, exclude_suffix=args.suffix)
+
+    last_refresh = time.monotonic()
+    try:
+        while True:
+            rows = tail.read_new_rows()
+            if not rows.empty:
+                for ecdf in ecdfs.values():
+                    ecdf.update(rows)
+            if args.once:
+                break
+            if time.monotonic() - last_refresh >= args.refresh:
+                refresh(ecdfs, args.suffix)
+                last_refresh = time.monotonic()
+            time.sleep(args.poll)
+    except KeyboardInterrupt:
+        pass
+    refresh(ecdfs, args.suffix)
+
+
+if __name__ == '__main__':
+    main()
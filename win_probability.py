@@ -0,0 +1,146 @@
+from best_cache import metric_table
+from matplotlib.ticker import FormatStrFormatter
+from registry import metrics, solver_codes, solver_order, solver_style
+from run_coverage import coverage_index, valid_time_window
+from time_grid import align_to_grid, time_grid
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+# Time grid of the win probabilities, as for the run-length curves
+time_grid_kind = 'log'
+num_times = 200
+given_time_values = None
+interpolation = 'step'
+
+# Use the runs that have data at each time, instead of only the times every run has data on
+partial_coverage = False
+
+# Number of heatmap panels, at evenly spread grid times
+num_panels = 6
+
+
+# Aligns every run on the time grid into an (instance x time x solver x seed) array. Runs missing
+# from the file and times before a run's first snapshot are NaN.
+def run_tensor(snapshots_df: pd.DataFrame, time_values: np.ndarray) -> tuple[list[str], np.ndarray]:
+    runs_df, values = align_to_grid(snapshots_df, time_values, interpolation)
+    tensor_solvers = solver_order(runs_df['solver'].unique())
+    _, instance_of_run = np.unique(runs_df['instance'].to_numpy(dtype=str), return_inverse=True)
+    seeds, seed_of_run = np.unique(runs_df['seed'].to_numpy(), return_inverse=True)
+    tensor = np.full((instance_of_run.max() + 1, len(time_values), len(tensor_solvers), len(seeds)), np.nan)
+    tensor[instance_of_run, :, solver_codes(runs_df['solver'], tensor_solvers), seed_of_run] = values
+    return tensor_solvers, tensor
+
+
+# Probability that a run of solver a has a better value than a run of solver b on the same instance
+# at the same time, ties counting one half (the Vargha-Delaney A statistic), averaged over the
+# instances. Every (instance, time) pools the seeds of all solvers into dense ranks; each block of
+# (instance, time, solver b) ranks is sorted once and offset so that all blocks form one sorted
+# array, so the number of b runs below and tied with every run of every solver a comes out of two
+# searchsorted calls, without comparing the seed pairs one by one.
+# Returns a (time x solver a x solver b) array, NaN where no instance has data for both solvers.
+def win_probability(tensor: np.ndarray, direction: str) -> np.ndarray:
+    num_instances, num_times, num_solvers, num_seeds = tensor.shape
+    num_groups = num_instances * num_times
+    pooled = (tensor if direction == 'max' else -tensor).reshape(num_groups, num_solvers * num_seeds)
+    valid = ~np.isnan(pooled)
+
+    # Dense rank of every value within its (instance, time); missing values take a rank above all
+    order = np.argsort(pooled, axis=1)
+    sorted_values = np.take_along_axis(pooled, order, axis=1)
+    sorted_ranks = np.concatenate([np.zeros((num_groups, 1), dtype=np.int64), np.cumsum(sorted_values[:, 1:] != sorted_values[:, :-1], axis=1)], axis=1)
+    ranks = np.empty_like(sorted_ranks)
+    np.put_along_axis(ranks, order, sorted_ranks, axis=1)
+    num_levels = num_solvers * num_seeds + 1
+    ranks = np.where(valid, ranks, num_levels - 1).reshape(num_groups, num_solvers, num_seeds)
+    valid = valid.reshape(num_groups, num_solvers, num_seeds)
+
+    # Block (group, b) holds the sorted ranks of solver b, offset past every earlier block
+    block = np.arange(num_groups * num_solvers, dtype=np.int64).reshape(num_groups, num_solvers)
+    sorted_keys = np.sort(block[:, :, None] * num_levels + ranks, axis=2).ravel()
+    query = block[:, None, None, :] * num_levels + ranks[:, :, :, None]
+    block_start = (block * num_seeds)[:, None, None, :]
+    below = np.searchsorted(sorted_keys, query, side='left') - block_start
+    tied = np.searchsorted(sorted_keys, query, side='right') - block_start - below
+    wins = np.where(valid[:, :, :, None], below + 0.5 * tied, 0.0).sum(axis=2)
+
+    num_valid = valid.sum(axis=2)
+    num_pairs = num_valid[:, :, None] * num_valid[:, None, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        probability = (wins / num_pairs).reshape(num_instances, num_times, num_solvers, num_solvers)
+        has_data = num_pairs.reshape(probability.shape) > 0
+        return np.where(has_data, probability, 0.0).sum(axis=0) / has_data.sum(axis=0)
+
+
+# Mean probability of every solver beating each of the others, over time
+def mean_win_probability(probability: np.ndarray) -> np.ndarray:
+    num_solvers = probability.shape[1]
+    others = ~np.eye(num_solvers, dtype=bool)
+    return np.where(others, probability, 0.0).sum(axis=2) / max(num_solvers - 1, 1)
+
+
+def plot_heatmaps(probability: np.ndarray, time_values: np.ndarray, matrix_solvers: list[str], metric_name: str, filename: str):
+    panels = np.unique(np.round(np.linspace(0, len(time_values) - 1, num_panels)).astype(int))
+    num_columns = int(np.ceil(len(panels) / 2))
+    fig, axes = plt.subplots(2, num_columns, figsize=(4 * num_columns, 7.5), squeeze=False)
+    for ax, panel in zip(axes.flat, panels):
+        image = ax.imshow(probability[panel], cmap='RdBu', vmin=0.0, vmax=1.0)
+        for i in range(len(matrix_solvers)):
+            for j in range(len(matrix_solvers)):
+                if i != j:
+                    ax.text(j, i, f'{probability[panel, i, j]:.2f}', ha='center', va='center', fontsize=7)
+        ax.set_title(f'Time {time_values[panel]:.4g}')
+        ax.set_xticks(range(len(matrix_solvers)), matrix_solvers, rotation=45, ha='right', fontsize=8)
+        ax.set_yticks(range(len(matrix_solvers)), matrix_solvers, fontsize=8)
+        ax.tick_params(labelleft=ax.get_subplotspec().is_first_col())
+    for ax in axes.flat[len(panels):]:
+        ax.set_visible(False)
+    fig.supxlabel('Solver b')
+    fig.supylabel('Solver a')
+    fig.colorbar(image, ax=axes, label='Probability that a has a better ' + metric_name)
+    fig.savefig(filename)
+    plt.close(fig)
+
+
+def plot_lines(mean_probability_df: pd.DataFrame, metric_name: str, filename: str):
+    plt.figure()
+    plt.xlabel('Time')
+    plt.ylabel('Mean probability of beating another solver')
+    plt.title(metric_name)
+    plt.grid(alpha=0.5, color='gray', linestyle='dashed', linewidth=0.5, which='both')
+    figure_solvers = list(mean_probability_df.columns)
+    for solver in figure_solvers:
+        style = solver_style(solver, figure_solvers)
+        plt.plot(mean_probability_df.index, mean_probability_df[solver], label=style['label'], marker = style['marker'], color = style['color'], alpha = 0.80, markevery = 0.1)
+    plt.xscale('log')
+    plt.ylim(0.0, 1.0)
+    plt.gca().yaxis.set_major_formatter(FormatStrFormatter('%.1f'))
+    plt.legend(loc='best')
+    plt.savefig(filename)
+    plt.close()
+
+
+def main():
+    # Load the data
+    metrics_snapshots_filename = 'metrics_snapshots.csv'
+
+    for key, metric in metrics.items():
+        snapshots_df = metric_table(metrics_snapshots_filename, metric['name'], require_complete=not partial_coverage)
+        window_start, _ = valid_time_window(coverage_index(snapshots_df), partial_coverage)
+        time_values = time_grid(snapshots_df, time_grid_kind, num_times, given_time_values)
+        time_values = time_values[time_values >= window_start]
+        matrix_solvers, tensor = run_tensor(snapshots_df, time_values)
+        probability = win_probability(tensor, metric['direction'])
+
+        # One row per (time, solver a), one column per solver b
+        index = pd.MultiIndex.from_product([time_values, matrix_solvers], names=['time', 'solver a'])
+        pd.DataFrame(probability.reshape(-1, len(matrix_solvers)), index=index, columns=matrix_solvers).to_csv(key + '_win_probability.csv')
+        mean_probability_df = pd.DataFrame(mean_win_probability(probability), index=pd.Index(time_values, name='time'), columns=matrix_solvers)
+        mean_probability_df.to_csv(key + '_win_probability_mean.csv')
+
+        plot_heatmaps(probability, time_values, matrix_solvers, metric['name'], key + '_win_probability.png')
+        plot_lines(mean_probability_df, metric['name'], key + '_win_probability_lines.png')
+
+
+if __name__ == '__main__':
+    main()